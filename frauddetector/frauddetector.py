@@ -12,20 +12,85 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
-import uuid
-import json
-
-
+import asyncio
 import logging
-from datetime import datetime
+import os
+import random
+import threading
 import time
-from IPython.display import clear_output, JSON
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from functools import cached_property, lru_cache
+from typing import Any
 
 import boto3
-import pandas as pd
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
 
 lh = logging.getLogger('frauddetector')
 
+
+def _clear_output():
+    """Clear the notebook cell output, a no-op outside IPython - imported lazily to keep module import light"""
+    try:
+        from IPython.display import clear_output
+    except ImportError:
+        return
+    clear_output(wait=True)
+
+
+# client-side rate limiting with exponential backoff absorbs throttling (HTTP 429) under concurrent load.
+# The one retry policy of every client: 10 attempts leave room for the bulk rule calls, whose throttled
+# requests would otherwise come back FAILED for the caller to resend
+RETRY_CONFIG = {'max_attempts': 10, 'mode': 'adaptive'}
+
+
+def _client_config(max_pool_connections):
+    # boto3 clients are thread-safe - size the connection pool so that concurrent calls reuse connections
+    # instead of discarding them (botocore default is 10) and paying a new TLS handshake per call
+    return Config(max_pool_connections=max_pool_connections,
+                  retries=RETRY_CONFIG,
+                  tcp_keepalive=True,
+                  # fail fast on a dead connection and let the adaptive retries take over
+                  connect_timeout=3,
+                  read_timeout=30)
+
+
+@lru_cache(maxsize=None)
+def _get_session(region):
+    """One shared boto3 session per region, credentials and service data are resolved once for all its clients"""
+    return boto3.session.Session(region_name=region)
+
+
+@lru_cache(maxsize=None)
+def _get_client(service_name, region, max_pool_connections=10):
+    """One shared (thread-safe) boto3 client per service, region and pool size. Building a client loads and parses
+    the service model, so FraudDetector instances for the same region reuse it instead of paying that each time"""
+    return _get_session(region).client(service_name, config=_client_config(max_pool_connections))
+
+
+@dataclass
+class RuleOpResult:
+    """Outcome of one rule in a create_rules / delete_rules batch
+
+    Filter on status == RuleOpResult.FAILED to retry only the rules that did not go through.
+    """
+    CREATED = "CREATED"
+    DELETED = "DELETED"
+    SKIPPED_EXISTS = "SKIPPED_EXISTS"
+    SKIPPED_DUPLICATE = "SKIPPED_DUPLICATE"
+    SKIPPED_INVALID = "SKIPPED_INVALID"
+    SKIPPED_IN_USE = "SKIPPED_IN_USE"
+    FAILED = "FAILED"
+
+    rule_id: Any
+    status: str
+    payload: Any = None
+
+
 class FraudDetector:
     """FraudDetector class to build, train and deploy.
 
@@ -38,7 +103,7 @@ class FraudDetector:
     """
 
     def __init__(self, entity_type, event_type, model_name, model_version, model_type,
-                 detector_name, region, detector_version="1"):
+                 detector_name, region, detector_version="1", max_workers=10, pool_size=64, session=None):
         """Build, train and deploy Amazon Fraud Detector models.
 
         Technical documentation on how Amazon Fraud Detector works can be
@@ -53,38 +118,158 @@ class FraudDetector:
             :model_type:           ONLINE_FRAUD_INSIGHTS / TRANSACTION_FRAUD_INSIGHTS
             :detector_name:        name for the fraud detection project
             :detector_version:     versioning for fraud detections
+            :max_workers:          number of concurrent API calls used by bulk operations such as batch_predict
+            :pool_size:            number of keep-alive HTTP connections held by the boto3 clients
+            :session:              boto3.session.Session to build the clients from, e.g. to share credentials and
+                                   config across instances; by default clients are shared per region and pool_size
 
         """
         self.region = region
-        self.fd = boto3.client("frauddetector", region_name=self.region)
-        self.s3 = boto3.client("s3")
-        self.iam = boto3.client('iam')
+        self.max_workers = max_workers
+        pool = max(pool_size, max_workers)
+        # kept for abatch_predict, whose aioboto3 client should resolve the same credentials
+        self._session = session
+        if session is not None:
+            config = _client_config(pool)
+            self.fd = session.client("frauddetector", region_name=self.region, config=config)
+            self.s3 = session.client("s3", region_name=self.region, config=config)
+            self.iam = session.client('iam', region_name=self.region, config=config)
+        else:
+            self.fd = _get_client("frauddetector", self.region, pool)
+            self.s3 = _get_client("s3", self.region, pool)
+            self.iam = _get_client("iam", self.region, pool)
         self.entity_type = entity_type
         self.event_type = event_type
         self.detector_name = detector_name
         self.detector_version = detector_version
         self.model_name = model_name
-        if "." not in str(model_version):  # check if missing decimal point - if so append ".00"
-            self.model_version = model_version + ".00"
-        else:
-            self.model_version = model_version
+        model_version = str(model_version)
+        # check if missing decimal point - if so append ".00"
+        self.model_version = model_version if "." in model_version else model_version + ".00"
+        assert "." in self.model_version  # model_status and friends rely on the normalized version number
         self.model_type = model_type
+        # {boto3 method name: (fetch time, response)} for describe-style listings, see _cached_call
+        self._cache = {}
+        # ruleDetails of this instance's detector and their {detectorId, ruleId, ruleVersion} refs, see _get_rules
+        self._rules_cache = None
+        self._rule_refs = []
+        # TRAINING_FAILED once seen for this model-version, see model_status
+        self._model_status_cache = None
+
+    def _paginate(self, name, key, **kwargs):
+        """Collect every page of a nextToken-paginated boto3 list call into a single {key: [...]} response.
+        The frauddetector client ships no boto3 paginators, and a single page silently truncates large accounts."""
+        method = getattr(self.fd, name)
+        response = method(**kwargs)
+        items = response[key]
+        while response.get('nextToken'):
+            response = method(nextToken=response['nextToken'], **kwargs)
+            items.extend(response[key])
+        return {key: items}
+
+    def _cached_call(self, name, key, ttl=30):
+        """Call a describe-style boto3 method (e.g. get_variables) and reuse its response for ttl seconds.
+        Listings change rarely, so repeated existence checks during bulk operations do not need a fresh round-trip."""
+        cached = self._cache.get(name)
+        if cached is not None and time.time() - cached[0] < ttl:
+            return cached[1]
+        response = self._paginate(name, key)
+        self._cache[name] = (time.time(), response)
+        return response
+
+    def _invalidate(self, *names):
+        """Drop cached listings after a mutating call"""
+        for name in names:
+            self._cache.pop(name, None)
+
+    def _cache_append(self, name, key, items):
+        """Add newly created resources to a cached listing rather than refetching the whole listing"""
+        cached = self._cache.get(name)
+        if cached is not None:
+            cached[1][key].extend(items)
+
+    def refresh(self):
+        """Drop all cached listings, the next access fetches them from Amazon Fraud Detector again"""
+        self._cache.clear()
+        self.__dict__.pop('model_variables', None)
+        self._rules_cache = None
+        self._rule_refs = []
+        self._model_status_cache = None
+
+    def _map_concurrent(self, fn, items, max_workers=None):
+        """Apply fn to every item on a thread pool sharing the (thread-safe) boto3 client.
+        Results are returned in input order."""
+        items = list(items)
+        if len(items) < 2:
+            # nothing to overlap - skip spinning up a pool for a single call
+            return [fn(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(max_workers or self.max_workers, len(items))) as ex:
+            return list(ex.map(fn, items))
+
+    @staticmethod
+    def _status_of(caller, item, call, **kwargs):
+        """(item, HTTPStatusCode) of one boto3 call, or (item, ClientError) so one failure doesn't abort a bulk call"""
+        try:
+            response = call(**kwargs)
+        except ClientError as e:
+            lh.warning("{}: {} failed: {}".format(caller, item, e))
+            return item, e
+        lh.info("{}: {} done".format(caller, item))
+        return item, response['ResponseMetadata']['HTTPStatusCode']
+
+    @staticmethod
+    def _raise_failures(caller, response_all):
+        """Raise one error naming every item of a bulk call that failed, once all of them have been attempted"""
+        failed = {item: e for item, e in response_all.items() if isinstance(e, Exception)}
+        if failed:
+            raise RuntimeError("{}: {} of {} failed: {}".format(caller, len(failed), len(response_all), failed))
+
+    @staticmethod
+    def _is_throttled(result):
+        """True if a RuleOpResult failed on a throttling error"""
+        return (result.status == RuleOpResult.FAILED and isinstance(result.payload, ClientError)
+                and result.payload.response.get('Error', {}).get('Code') in ('ThrottlingException',
+                                                                             'TooManyRequestsException'))
+
+    def _map_rule_chunks(self, fn, items, chunk_size, max_workers=None, label="rules", max_retries=3):
+        """_map_concurrent over chunk_size slices of items, logging progress. Items of a chunk that come back
+        throttled are sent again after a jittered backoff, up to max_retries times, before the next chunk starts.
+        Results are returned in input order."""
+        items = list(items)
+        results = []
+        delay = 1.0
+        for start in range(0, len(items), chunk_size):
+            chunk = items[start:start + chunk_size]
+            chunk_results = self._map_concurrent(fn, chunk, max_workers=max_workers)
+            for _ in range(max_retries):
+                throttled = [i for i, r in enumerate(chunk_results) if self._is_throttled(r)]
+                if not throttled:
+                    break
+                lh.warning("{}: {} throttled, pausing before sending them again".format(label, len(throttled)))
+                time.sleep(delay * random.uniform(0.8, 1.2))
+                delay = min(30.0, delay * 2)
+                retried = self._map_concurrent(fn, [chunk[i] for i in throttled], max_workers=max_workers)
+                for i, result in zip(throttled, retried):
+                    chunk_results[i] = result
+            results.extend(chunk_results)
+            lh.info("{}: {}/{} done".format(label, len(results), len(items)))
+        return results
 
     @property
     def all_entities(self):
-        return self.fd.get_entity_types()
+        return self._cached_call('get_entity_types', 'entityTypes')
 
     def get_entity_type(self):
         """ Get entities for this instance"""
-        return self.fd.get_entity_types(name=self.entity_type)["eventTypes"]
+        return [e for e in self.all_entities['entityTypes'] if e['name'] == self.entity_type]
 
     @property
     def entity_type_details(self):
-        return self.get_entity_types()
+        return self.get_entity_type()
 
     @property
     def all_events(self):
-        return self.fd.get_event_types()
+        return self._cached_call('get_event_types', 'eventTypes')
 
     def get_event_type(self):
         """Get event-type details for this instance created in Amazon Fraud Detector cloud service
@@ -107,7 +292,8 @@ class FraudDetector:
         ]
 
         """
-        return self.fd.get_event_types(name=self.event_type)["eventTypes"]
+        # served from the cached listing - get_variables and get_labels both read it during one setup
+        return [e for e in self.all_events['eventTypes'] if e['name'] == self.event_type]
 
     @property
     def event_type_details(self):
@@ -115,11 +301,15 @@ class FraudDetector:
 
     @property
     def all_variables(self):
-        return self.fd.get_variables()
+        return self._cached_call('get_variables', 'variables')
+
+    def _event_type_raw(self):
+        """This instance's event-type dict, one lookup in the cached event-type listing for both variables and labels"""
+        return self.get_event_type()[0]
 
     def get_variables(self):
         """Get variable details associated with this event-type"""
-        return self.event_type_details.pop()["eventVariables"]
+        return self._event_type_raw()["eventVariables"]
 
     @property
     def variables(self):
@@ -128,15 +318,15 @@ class FraudDetector:
     @property
     def all_labels(self):
         """Get labels already created in Amazon Fraud Detector cloud service"""
-        return self.fd.get_labels()
+        return self._cached_call('get_labels', 'labels')
 
     def get_labels(self):
         """Get labels associated with this Event Type"""
-        return self.event_type_details.pop()["labels"]
+        return self._event_type_raw()["labels"]
 
     @property
     def labels(self):
-        return self.fd.get_labels()
+        return self._cached_call('get_labels', 'labels')
 
     def get_models(self, model_version=None):
         """Get model details for all model versions related to this instances model_id (model_name)"""
@@ -145,52 +335,57 @@ class FraudDetector:
                                                    modelVersionNumber=self.model_version,
                                                    modelType=self.model_type)['modelVersionDetails']
         else:
-            return self.fd.describe_model_versions(modelId=self.model_name, modelType=self.model_type)['modelVersionDetails']
+            return self._paginate('describe_model_versions', 'modelVersionDetails',
+                                  modelId=self.model_name, modelType=self.model_type)['modelVersionDetails']
 
     @property
     def all_models(self):
         """Get all models already created in Amazon Fraud Detector cloud service"""
-        return self.fd.get_models()
+        return self._cached_call('get_models', 'models')
 
     @property
     def model_status(self):
-        model_version_number = str(self.model_version)
-        # check if missing decimal point - if so append ".00" to work around format requirement in FD
-        if "." not in model_version_number:
-            model_version_number = model_version_number + ".00"
-
+        """Status of this instance's model-version. A failed training never recovers, so TRAINING_FAILED is remembered
+        (until refresh() or a new fit) instead of asking the service on every poll"""
+        if self._model_status_cache is not None:
+            return self._model_status_cache
         try:
             response = self.fd.get_model_version(modelId=self.model_name,
                                              modelType=self.model_type,
-                                             modelVersionNumber=model_version_number)
-            return response['status']
+                                             modelVersionNumber=self.model_version)
         except self.fd.exceptions.ResourceNotFoundException:
             return None
+        if response['status'] == 'TRAINING_FAILED':
+            self._model_status_cache = response['status']
+        return response['status']
 
     def get_model_variables(self):
         """Get variables and their details associated with this instance's model_id (model_name)"""
         return self.get_models(model_version=self.model_version)[0]['trainingDataSchema']['modelVariables']
 
-    @property
+    @cached_property
     def model_variables(self):
-        """List of variable-names for this detector-model instance"""
+        """List of variable-names for this detector-model instance.
+        A model-version's training schema does not change, so it is fetched once (refresh() drops it)"""
         return self.get_model_variables()
 
     @property
     def outcomes(self):
         """Outcomes are not directly linked to the detector-instance - they can be referenced and shared by multiple
         detectors"""
-        outcomes_response = self.fd.get_outcomes()['outcomes']
-        names = [x['name'] for x in outcomes_response]
-        descriptions = [x['description'] for x in outcomes_response]
-
-        return list(zip(names, descriptions))
+        outcomes_response = self._cached_call('get_outcomes', 'outcomes')['outcomes']
+        return [(x['name'], x['description']) for x in outcomes_response]
     
     def _setup_project(self, variables=variables, labels=labels):
         """Automatically setup your Amazon Fraud Detector project."""
-        response = self.create_entity_type()
-        response = self.create_labels(labels)
-        response = self.create_variables(variables)
+        # entity type, labels and variables don't depend on each other - create them concurrently,
+        # the event type references all three and the model references the event type
+        with ThreadPoolExecutor(max_workers=3) as ex:
+            futures = [ex.submit(self.create_entity_type),
+                       ex.submit(self.create_labels, labels),
+                       ex.submit(self.create_variables, variables)]
+            for f in futures:
+                f.result()
         response = self.create_event_type(variables, labels)
         response = self.create_model()
         return "Success"
@@ -206,8 +401,8 @@ class FraudDetector:
             :response_all:      {variable_name: API-response-status, variable_name: API-response-status} dict
         """
 
-        existing_names = [m['modelId'] for m in self.all_models['models']]
-        response_all = []
+        existing_names = {m['modelId'] for m in self.all_models['models']}
+        response_all = {}
 
         if self.model_name not in existing_names:
 
@@ -222,19 +417,19 @@ class FraudDetector:
                 modelType=self.model_type
             )
             lh.info("create_model: entity {} created".format(self.model_name))
-            status = {self.model_name: response['ResponseMetadata']['HTTPStatusCode']}
-            response_all.append(status)
+            self._cache_append('get_models', 'models', [{'modelId': self.model_name,
+                                                         'modelType': self.model_type,
+                                                         'eventTypeName': self.event_type}])
+            response_all[self.model_name] = response['ResponseMetadata']['HTTPStatusCode']
         else:
             lh.warning("create_model: entity {} already exists, skipping".format(self.model_name))
-            status = {self.model_name: "skipped"}
-            response_all.append(status)
+            response_all[self.model_name] = "skipped"
 
-        # convert list of dicts to single dict
-        response_all = {k: v for d in response_all for k, v in d.items()}
         return response_all
 
     def set_model_version_inactive(self):
         # set model inactive
+        self._model_status_cache = None
         response = self.fd.update_model_version_status(
             modelId=self.model_name,
             modelType=self.model_type,
@@ -255,6 +450,7 @@ class FraudDetector:
             modelType=self.model_type
         )
         lh.info("delete_model: model {} deleted".format(self.model_name,self.model_version))
+        self._invalidate('get_models')
         status = {self.model_name: response['ResponseMetadata']['HTTPStatusCode']}
 
         return status
@@ -270,6 +466,9 @@ class FraudDetector:
             mv = model_version
         else:
             mv = self.model_version
+        if mv == self.model_version:
+            self.__dict__.pop('model_variables', None)
+            self._model_status_cache = None
 
         return self.fd.delete_model_version(
             modelId=self.model_name,
@@ -288,8 +487,8 @@ class FraudDetector:
             :response_all:      {variable_name: API-response-status, variable_name: API-response-status} dict
         """
 
-        existing_names = [e['name'] for e in self.all_entities['entityTypes']]
-        response_all = []
+        existing_names = {e['name'] for e in self.all_entities['entityTypes']}
+        response_all = {}
 
         if self.entity_type not in existing_names:
 
@@ -299,37 +498,27 @@ class FraudDetector:
                 name = self.entity_type
             )
             lh.info("create_entity_type: entity {} created".format(self.entity_type))
-            status = {self.entity_type: response['ResponseMetadata']['HTTPStatusCode']}
-            response_all.append(status)
+            self._cache_append('get_entity_types', 'entityTypes', [{'name': self.entity_type}])
+            response_all[self.entity_type] = response['ResponseMetadata']['HTTPStatusCode']
         else:
             lh.warning("create_entity_type: entity {} already exists, skipping".format(self.entity_type))
-            status = {self.event_type: "skipped"}
-            response_all.append(status)
+            response_all[self.entity_type] = "skipped"
 
-        # convert list of dicts to single dict
-        response_all = {k: v for d in response_all for k, v in d.items()}
         return response_all
     
     def delete_entity_type(self):
-        """Delete Amazon FraudDetector event. Wraps the boto3 SDK API to allow bulk operations.
-
-        Args:
-            :event:          name of the event to delete
+        """Delete this instance's Amazon FraudDetector entity type.
 
         Returns:
-            :response_all:   {variable_name: API-response-status, variable_name: API-response-status} dict
+            :response_all:   {entity_type: API-response-status} dict
         """
-        response_all = []
         response = self.fd.delete_entity_type(
             name=self.entity_type,
         )
         lh.info("delete_entity_type: entity {} deleted".format(self.entity_type))
-        status = {self.entity_type: response['ResponseMetadata']['HTTPStatusCode']}
-        response_all.append(status)
+        self._invalidate('get_entity_types')
 
-        # convert list of dicts to single dict
-        response_all = {k: v for d in response_all for k, v in d.items()}
-        return response_all
+        return {self.entity_type: response['ResponseMetadata']['HTTPStatusCode']}
         
     def create_event_type(self, variables, labels):
         """Create Amazon FraudDetector event. Wraps the boto3 SDK API to allow bulk operations.
@@ -363,8 +552,8 @@ class FraudDetector:
             :response_all:      {variable_name: API-response-status, variable_name: API-response-status} dict
         """
 
-        existing_names = [e['name'] for e in self.all_events['eventTypes']]
-        response_all = []
+        existing_names = {e['name'] for e in self.all_events['eventTypes']}
+        response_all = {}
 
         if self.event_type not in existing_names:
             lh.debug("create_event_type: {}".format(self.event_type))
@@ -376,15 +565,15 @@ class FraudDetector:
                 entityTypes = [self.entity_type]
             )
             lh.info("create_event_type: event {} created".format(self.event_type))
-            status = {self.event_type: response['ResponseMetadata']['HTTPStatusCode']}
-            response_all.append(status)
+            self._cache_append('get_event_types', 'eventTypes', [{'name': self.event_type,
+                                                                  'eventVariables': [v["name"] for v in variables],
+                                                                  'labels': [l["name"] for l in labels],
+                                                                  'entityTypes': [self.entity_type]}])
+            response_all[self.event_type] = response['ResponseMetadata']['HTTPStatusCode']
         else:
             lh.warning("create_event_type: event {} already exists, skipping".format(self.event_type))
-            status = {self.event_type: "skipped"}
-            response_all.append(status)
+            response_all[self.event_type] = "skipped"
 
-        # convert list of dicts to single dict
-        response_all = {k: v for d in response_all for k, v in d.items()}
         return response_all
 
     def delete_events_by_type(self):
@@ -398,26 +587,18 @@ class FraudDetector:
 
 
     def delete_event_type(self):
-        """Delete Amazon FraudDetector event. Wraps the boto3 SDK API to allow bulk operations.
-
-        Args:
-            :event:          name of the event to delete
+        """Delete this instance's Amazon FraudDetector event type.
 
         Returns:
-            :response_all:   {variable_name: API-response-status, variable_name: API-response-status} dict
+            :response_all:   {event_type: API-response-status} dict
         """
-        response_all = []
-
         lh.info("delete_event_type: delete event-type {}".format(self.event_type))
         response = self.fd.delete_event_type(
             name=self.event_type,
         )
-        status = {self.event_type: response['ResponseMetadata']['HTTPStatusCode']}
-        response_all.append(status)
+        self._invalidate('get_event_types')
 
-        # convert list of dicts to single dict
-        response_all = {k: v for d in response_all for k, v in d.items()}
-        return response_all
+        return {self.event_type: response['ResponseMetadata']['HTTPStatusCode']}
 
     def create_variables(self, variables):
         """Create Amazon FraudDetector variables.  Wraps the boto3 SDK API to allow bulk operations.
@@ -438,13 +619,13 @@ class FraudDetector:
                                     ...
                                 ]
         Returns:
-            :response_all:      {variable_name: API-response-status, variable_name: API-response-status} dict
+            :response_all:      {variable_name: API-response-status, variable_name: API-response-status} dict,
+                                "skipped" for existing variables and the ClientError for failed calls
         """
 
-        existing_names = [v['name'] for v in self.fd.get_variables()['variables']]
-        response_all = []
+        existing_names = {v['name'] for v in self.all_variables['variables']}
 
-        for v in variables:
+        def _create_variable(v):
             if v['name'] not in existing_names:
 
                 # handle missing keys for incomplete JSON spec
@@ -457,45 +638,43 @@ class FraudDetector:
                         default_value = "0.0"
                 # create variables via Boto3 SDK fd instance
                 lh.debug("create_variables: {} {} defaultValue {}".format(v['name'], v['variableType'], default_value))
-                response = self.fd.create_variable(
+                return self._status_of(
+                    "create_variables", v['name'], self.fd.create_variable,
                     name=v['name'],
                     variableType=v['variableType'],
                     dataSource='EVENT',
                     dataType=data_type,
                     defaultValue=default_value
                     )
-                lh.info("create_variables: variable {} created".format(v['name']))
-                status = {v['name']: response['ResponseMetadata']['HTTPStatusCode']}
-                response_all.append(status)
             else:
                 lh.warning("create_variables: variable {} already exists, skipping".format(v['name']))
-                status = {v['name']: "skipped"}
-                response_all.append(status)
+                return v['name'], "skipped"
+
+        # each create_variable call is an independent round-trip - issue them concurrently
+        response_all = dict(self._map_concurrent(_create_variable, variables))
+        self._cache_append('get_variables', 'variables',
+                           [dict(v) for v in variables if isinstance(response_all[v['name']], int)])
 
-        # convert list of dicts to single dict
-        response_all = {k: v for d in response_all for k, v in d.items()}
         return response_all
 
-    def delete_variables(self, variables):
+    def delete_variables(self, variables, raise_on_error=False):
         """Delete Amazon FraudDetector variables.  Wraps the boto3 SDK API to allow bulk operations.
 
         Args:
             :variables:      list of variable-names to delete
+            :raise_on_error: raise one RuntimeError listing every failed delete instead of returning the ClientErrors
 
         Returns:
             :response_all:   {variable_name: API-response-status, variable_name: API-response-status} dict
         """
-        response_all = []
-        for vname in variables:
-            response = self.fd.delete_variable(
-                name=vname,
-            )
-            lh.info("delete_variables: variable {} deleted".format(vname))
-            status = {vname: response['ResponseMetadata']['HTTPStatusCode']}
-            response_all.append(status)
+        def _delete_variable(vname):
+            return self._status_of("delete_variables", vname, self.fd.delete_variable, name=vname)
+
+        response_all = dict(self._map_concurrent(_delete_variable, variables))
+        self._invalidate('get_variables')
+        if raise_on_error:
+            self._raise_failures("delete_variables", response_all)
 
-        # convert list of dicts to single dict
-        response_all = {k: v for d in response_all for k, v in d.items()}
         return response_all
     
     def create_labels(self, labels):
@@ -517,61 +696,68 @@ class FraudDetector:
             :response_all:              {variable_name: API-response-status, variable_name: API-response-status} dict
         """
 
-        existing_names = [l['name'] for l in self.labels['labels']]
-        response_all = []
+        existing_names = {l['name'] for l in self.all_labels['labels']}
 
-        for l in labels:
+        def _create_label(l):
             if l['name'] not in existing_names:
                 # create label via Boto3 SDK fd instance
                 lh.debug("put_label: {}".format(l['name']))
-                response = self.fd.put_label(
-                    name=str(l['name']),
-                    description=l['name']
-                )
-                lh.info("create_labels: label {} created".format(l['name']))
-                status = {l['name']: response['ResponseMetadata']['HTTPStatusCode']}
-                response_all.append(status)
+                return self._status_of("create_labels", l['name'], self.fd.put_label,
+                                       name=str(l['name']), description=l['name'])
             else:
                 lh.warning("create_labels: label {} already exists, skipping".format(l['name']))
-                status = {l['name']: "skipped"}
-                response_all.append(status)
+                return l['name'], "skipped"
+
+        response_all = dict(self._map_concurrent(_create_label, labels))
+        self._cache_append('get_labels', 'labels',
+                           [dict(l) for l in labels if isinstance(response_all[l['name']], int)])
 
-        # convert list of dicts to single dict
-        response_all = {k: v for d in response_all for k, v in d.items()}
         return response_all
 
-    def delete_labels(self, labels):
+    def delete_labels(self, labels, raise_on_error=False):
         """Delete Amazon FraudDetector labels. Wraps the boto3 SDK API to allow bulk operations.
 
         Args:
             :labels:      list of label-names to delete
+            :raise_on_error: raise one RuntimeError listing every failed delete instead of returning the ClientErrors
 
         Returns:
             :response_all:   {variable_name: API-response-status, variable_name: API-response-status} dict
         """
-        response_all = []
-        for lname in labels:
-            response = self.fd.delete_label(
-                name=lname,
-            )
-            lh.info("delete_labels: label {} deleted".format(lname))
-            status = {lname: response['ResponseMetadata']['HTTPStatusCode']}
-            response_all.append(status)
+        def _delete_label(lname):
+            return self._status_of("delete_labels", lname, self.fd.delete_label, name=lname)
+
+        response_all = dict(self._map_concurrent(_delete_label, labels))
+        self._invalidate('get_labels')
+        if raise_on_error:
+            self._raise_failures("delete_labels", response_all)
 
-        # convert list of dicts to single dict
-        response_all = {k: v for d in response_all for k, v in d.items()}
         return response_all
 
     def create_outcomes(self, outcomes_list):
         """ Create outcomes for detector
             Args:
                 :outcomes_list:          list; list of (outcome_name, outcome_description) tuples
+
+            Returns:
+                :response_all:           {outcome_name: API-response-status, "skipped" or ClientError} dict
         """
-        for outcome in outcomes_list:
-            self.fd.put_outcome(
-                name=outcome[0],
-                description=outcome[1]
-            )
+        # put_outcome also updates descriptions, so only an identical (name, description) pair is skipped
+        existing = set(self.outcomes)
+
+        def _create_outcome(outcome):
+            name, description = outcome[0], outcome[1]
+            if (name, description) in existing:
+                lh.warning("create_outcomes: outcome {} already exists, skipping".format(name))
+                return name, "skipped"
+            return self._status_of("create_outcomes", name, self.fd.put_outcome,
+                                   name=name, description=description)
+
+        response_all = dict(self._map_concurrent(_create_outcome, outcomes_list))
+        if any(status != "skipped" for status in response_all.values()):
+            self._invalidate('get_outcomes')
+
+        return response_all
 
     def delete_outcomes(self, outcome_names):
         """Delete Amazon FraudDetector outcomes. Cannot delete outcome that is used in a rule-version.
@@ -583,15 +769,12 @@ class FraudDetector:
             :response_all:   {variable_name: API-response-status, variable_name: API-response-status} dict
         """
 
-        response_all = []
-        for name in outcome_names:
-            response = self.fd.delete_outcome(name=name)
-            lh.info("delete_outcomes: label {} deleted".format(name))
-            status = {name: response['ResponseMetadata']['HTTPStatusCode']}
-            response_all.append(status)
+        def _delete_outcome(name):
+            return self._status_of("delete_outcomes", name, self.fd.delete_outcome, name=name)
+
+        response_all = dict(self._map_concurrent(_delete_outcome, outcome_names))
+        self._invalidate('get_outcomes')
 
-        # convert list of dicts to single dict
-        response_all = {k: v for d in response_all for k, v in d.items()}
         return response_all
 
 
@@ -606,6 +789,7 @@ class FraudDetector:
         """
 
         self._setup_project(variables=variables, labels=labels)
+        self._model_status_cache = None
 
         event_details = {
             'dataLocation'     : data_location,
@@ -621,25 +805,29 @@ class FraudDetector:
             externalEventsDetail=event_details
         )
         lh.info("Wait for model training to complete...")
-        stime = time.time()
+        stime = time.monotonic()  # monotonic - elapsed time is immune to wall-clock (NTP/DST) adjustments
+        delay = 10  # -- first poll after ~10 seconds, backing off to at most 2 minutes
+        version_kwargs = {'modelId': self.model_name,
+                          'modelType': self.model_type,
+                          'modelVersionNumber': self.model_version}
+        polls = 0
         while wait:
-            current_time = datetime.now()
-            clear_output(wait=True)
-            response = self.fd.get_model_version(
-                modelId=self.model_name,
-                modelType=self.model_type,
-                modelVersionNumber=self.model_version)
-            if response['status'] == 'TRAINING_IN_PROGRESS':
-                lh.info(f"{current_time}: current progress: {(time.time() - stime)/60:{3}.{3}} minutes")
-                time.sleep(60)  # -- sleep for 60 seconds 
+            response = self.fd.get_model_version(**version_kwargs)
             if response['status'] != 'TRAINING_IN_PROGRESS':
-                lh.info(f"{current_time}: Model status : {response['status']}")
+                lh.info("%s: Model status : %s", datetime.now(), response['status'])
                 break
-        etime = time.time()
+            # -- report every 5th poll only, the backoff already spaces polls minutes apart
+            if polls % 5 == 0:
+                _clear_output()
+                lh.info("%s: current progress: %.1f minutes", datetime.now(), (time.monotonic() - stime) / 60)
+            polls += 1
+            # jitter so that trainings started together do not poll in lock-step
+            time.sleep(delay * random.uniform(0.8, 1.2))
+            delay = min(120, delay * 1.5)
 
         # -- summarize -- 
         lh.info("\nModel training complete")
-        lh.info("\nElapsed time : %s" % (etime - stime) + " seconds \n")
+        lh.info("\nElapsed time : %.1f seconds \n", time.monotonic() - stime)
         return response
 
 
@@ -650,7 +838,7 @@ class FraudDetector:
             :outcomes_list:          list; list of (outcome_name, outcome_description) tuples
         """
 
-        if self.model_status != 'TRAINING_COMPLETE' and self.model_status != 'ACTIVE':
+        if self.model_status not in ('TRAINING_COMPLETE', 'ACTIVE'):
             raise EnvironmentError("model training must be complete before compiling")
 
         # create a new detector
@@ -689,21 +877,28 @@ class FraudDetector:
         return response
 
 
-    def predict(self, event_timestamp, event_variables, entity_id="unknown"):
+    def predict(self, event_timestamp, event_variables, entity_id="unknown", event_id=None):
         """Predict using your Amazon Forecast model
 
         Args:
             :event_timestamp:   A string indicating the timestamp key
             :event_variables:   A dict with your event variables
             :entity_id:         The unique ID of your entity if known
+            :event_id:          The unique ID of this event, a random UUID is generated if not supplied
 
         Returns:
             :score:   {'credit_card_model_insightscore': 14.0, 'ruleResults': ['verify_outcome']} dict
         """
         response = self.fd.get_event_prediction(
+            **self._prediction_request(event_timestamp, event_variables, entity_id, event_id))
+        return self._prediction_score(response)
+
+    def _prediction_request(self, event_timestamp, event_variables, entity_id, event_id=None):
+        """get_event_prediction keyword arguments for a single event"""
+        return dict(
             detectorId=self.detector_name,
             detectorVersionId=self.detector_version,
-            eventId=str(uuid.uuid4()),
+            eventId=event_id or str(uuid.uuid4()),
             eventTypeName=self.event_type,
             entities=[
                 {
@@ -714,19 +909,78 @@ class FraudDetector:
             eventTimestamp=event_timestamp,
             eventVariables = event_variables
         )
+
+    @staticmethod
+    def _prediction_score(response):
+        """Reduce a get_event_prediction response to the model scores plus rule results"""
         score = response['modelScores'][0]["scores"]
         score["ruleResults"] = response['ruleResults']
         return score
 
-
-    def batch_predict(self, timestamp, events=None, df=None, entity_id="unknown"):
+    @staticmethod
+    def _event_ids(n):
+        """Generate n random (version 4) UUID event ids from a single os.urandom call instead of one per event"""
+        rand = os.urandom(16 * n)
+        return [str(uuid.UUID(bytes=rand[i * 16:(i + 1) * 16], version=4)) for i in range(n)]
+
+    @staticmethod
+    def _dataframe_columns(timestamp, events):
+        """Split a DataFrame of observations into its service-formatted timestamps and all-string variable columns"""
+        import pandas as pd
+
+        # parse the whole column in one vectorized call rather than one pd.to_datetime per row,
+        # datetime64 columns need no parsing - naive values are taken as UTC, aware ones converted to it
+        timestamps = events[timestamp]
+        if not pd.api.types.is_datetime64_any_dtype(timestamps):
+            timestamps = pd.to_datetime(timestamps, utc=True, cache=True)
+        elif timestamps.dt.tz is not None:
+            timestamps = timestamps.dt.tz_convert('UTC')
+        timestamps = timestamps.dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+        # the service expects string values - cast column-wise once instead of str() per cell
+        return timestamps, events.drop(columns=[timestamp]).astype(str)
+
+    @staticmethod
+    def _dataframe_events(timestamp, events):
+        """Convert a DataFrame of observations into a list of (event_timestamp, event_variables) tuples"""
+        timestamps, variables = FraudDetector._dataframe_columns(timestamp, events)
+        cols = list(variables.columns)
+        # struct-of-arrays: one contiguous object array per variable, zipped per event at build time
+        arrays = [variables[c].to_numpy() for c in cols]
+        return [(ts, dict(zip(cols, row)))
+                for ts, row in zip(timestamps.to_numpy(), zip(*arrays))]
+
+
+    def _batch_rows(self, caller, timestamp, events, df):
+        """(event_timestamp, event_variables) tuples of the JSON events or DataFrame handed to a batch prediction"""
+        if df is None and isinstance(events, (dict, list, tuple)):
+            # JSON events: one dict or a list of dicts holding the timestamp key next to the event variables
+            if isinstance(events, dict):
+                events = [events]
+            missing = [i for i, event in enumerate(events) if timestamp not in event]
+            if missing:
+                raise KeyError("{}: timestamp key {!r} missing from events at positions {}".format(
+                    caller, timestamp, missing[:10]))
+            return [(event[timestamp], {k: str(v) for k, v in event.items() if k != timestamp}) for event in events]
+        # the frame may come in through df (documented) or, as before, through events
+        frame = df if df is not None else events
+        if timestamp not in frame.columns:
+            raise KeyError("{}: timestamp column {!r} not in DataFrame columns {}".format(
+                caller, timestamp, list(frame.columns)))
+        return self._dataframe_events(timestamp, frame)
+
+    def batch_predict(self, timestamp, events=None, df=None, entity_id="unknown", max_workers=None, max_in_flight=None):
         """Batch predict using your Amazon Forecast model
 
         Args:
             :timestamp:   A string indicating either the timestamp key or column
-            :events:      A list of JSON events
+            :events:      A list of JSON events (dicts including the timestamp key), or a DataFrame
             :df:          A Pandas DataFrame with your observations for prediction
             :entity_id:   The unique ID of your entity if known
+            :max_workers: Number of concurrent prediction requests, defaults to the instance max_workers
+            :max_in_flight: Cap on submitted-but-unfinished requests, defaults to twice max_workers; submission
+                          blocks at the cap so large frames don't queue every request up front
+
+        For many thousands of events prefer batch_predict_job, which scores them in one service-side job.
 
         Returns:
             :predictions:   [{'credit_card_model_insightscore': 14.0, 'ruleResults': ['verify_outcome']}] list
@@ -734,48 +988,201 @@ class FraudDetector:
         if events is None and df is None:
             print("Please provide either a JSON object through events or a Pandas DataFrame through df!")
             return []
-        predictions = []
-        if type(events) == "dict":
-            for event in events:
-                event_timestamp = event[timestamp]
-                tmp = event.pop(timestamp)
-                predictions.append(
-                    self.predict(
-                        event_timestamp=event_timestamp,
-                        event_variables=event,
-                        entity_id=entity_id))
-        else:
-            try:
-                events.loc[:, timestamp] = events.loc[:, timestamp].apply(lambda x: pd.to_datetime(x).strftime('%Y-%m-%dT%H:%M:%SZ'))
-                for i in range(events.shape[0]):
-                    event = json.loads(events.iloc[i, :].to_json())
-                    for key in event:
-                        event[key] = str(event[key])
-                    event_timestamp = event[timestamp]
-                    tmp = event.pop(timestamp)
-                    predictions.append(
-                        self.predict(
-                            event_timestamp=event_timestamp,
-                            event_variables=event,
-                            entity_id=entity_id))
-            except Exception as e:
-                print("Warning: Make sure your input DataFrame complies with the service rules!")
-                print(e)
-        return predictions
+        rows = self._batch_rows("batch_predict", timestamp, events, df)
+        event_ids = self._event_ids(len(rows))
+
+        # a pool costs more to spin up than it saves for one or two events
+        if len(rows) < 3:
+            return [self.predict(event_timestamp=row[0], event_variables=row[1],
+                                 entity_id=entity_id, event_id=event_id)
+                    for row, event_id in zip(rows, event_ids)]
+
+        # get_event_prediction is network bound - fan the calls out over a thread pool,
+        # collecting futures in submission order keeps predictions aligned with the input rows
+        workers = max_workers or self.max_workers
+        in_flight = threading.BoundedSemaphore(max_in_flight or 2 * workers)
+        futures = []
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            for row, event_id in zip(rows, event_ids):
+                in_flight.acquire()
+                future = ex.submit(self.predict, event_timestamp=row[0], event_variables=row[1],
+                                   entity_id=entity_id, event_id=event_id)
+                future.add_done_callback(lambda _: in_flight.release())
+                futures.append(future)
+            return [f.result() for f in futures]
+
+    def _async_session(self):
+        """aioboto3 session for abatch_predict, resolving the same credentials and region as the injected boto3 session.
+        Only static keys are copied over - profiles, assumed roles and instance credentials are resolved again by
+        aiobotocore's own provider chain, which refreshes them before they expire during a long batch"""
+        import aioboto3
+        if self._session is None:
+            return aioboto3.Session()
+        credentials = self._session.get_credentials()
+        if credentials is not None and credentials.method == 'explicit':
+            frozen = credentials.get_frozen_credentials()
+            return aioboto3.Session(aws_access_key_id=frozen.access_key,
+                                    aws_secret_access_key=frozen.secret_key,
+                                    aws_session_token=frozen.token,
+                                    region_name=self._session.region_name)
+        profile = self._session.profile_name
+        return aioboto3.Session(profile_name=profile if profile in self._session.available_profiles else None,
+                                region_name=self._session.region_name)
+
+    async def abatch_predict(self, timestamp, events=None, df=None, entity_id="unknown", concurrency=100,
+                             return_exceptions=False):
+        """Batch predict with asyncio - all requests are multiplexed on one event loop instead of one thread each.
+        Requires the optional aioboto3 package (pip install frauddetector[async]).
 
+        Args:
+            :timestamp:   A string indicating either the timestamp key or column
+            :events:      A list of JSON events (dicts including the timestamp key), or a DataFrame
+            :df:          A Pandas DataFrame with your observations for prediction
+            :entity_id:   The unique ID of your entity if known
+            :concurrency: Maximum number of prediction requests in flight
+            :return_exceptions: put a failed request's exception in its slot instead of failing the whole batch
 
-    @property
-    def rules(self):
-        """list of rules associated with this instance's detector
-                paginated API not used - max limit 100 records
-                """
-        rules = self.fd.get_rules(
-            detectorId=self.detector_name
+        Returns:
+            :predictions:   [{'credit_card_model_insightscore': 14.0, 'ruleResults': ['verify_outcome']}] list
+        """
+        try:
+            import aioboto3
+        except ImportError:
+            raise ImportError("abatch_predict requires aioboto3, install it with: pip install frauddetector[async]")
+
+        if events is None and df is None:
+            raise ValueError("abatch_predict: provide either JSON events through events or a DataFrame through df")
+        rows = self._batch_rows("abatch_predict", timestamp, events, df)
+        event_ids = self._event_ids(len(rows))
+        semaphore = asyncio.Semaphore(concurrency)
+        config = _client_config(concurrency)
+        async with self._async_session().client("frauddetector", region_name=self.region, config=config) as fd:
+
+            async def _apredict(row, event_id):
+                async with semaphore:
+                    response = await fd.get_event_prediction(
+                        **self._prediction_request(row[0], row[1], entity_id, event_id))
+                return self._prediction_score(response)
+
+            # gather preserves input order
+            return await asyncio.gather(*[_apredict(row, event_id) for row, event_id in zip(rows, event_ids)],
+                                        return_exceptions=return_exceptions)
+
+    @staticmethod
+    def _split_s3_uri(uri):
+        """(bucket, key) of an s3://bucket/key URI, ValueError for anything else"""
+        if not isinstance(uri, str) or not uri.startswith("s3://"):
+            raise ValueError("batch_predict_job: {!r} is not an s3://bucket/key URI".format(uri))
+        bucket, _, key = uri[len("s3://"):].partition("/")
+        if not bucket:
+            raise ValueError("batch_predict_job: {!r} names no bucket".format(uri))
+        return bucket, key
+
+    def batch_predict_job(self, input_s3_uri, output_s3_uri, role_arn, df=None, timestamp=None,
+                          entity_id="unknown", job_id=None, wait=True, timeout=6 * 3600):
+        """Score a large batch with an Amazon Fraud Detector batch prediction job instead of one
+        get_event_prediction call per event - the service reads the events from S3 and writes the results back.
+        https://docs.aws.amazon.com/frauddetector/latest/ug/batch-predictions.html
+
+        Args:
+            :input_s3_uri:  s3://bucket/key of the CSV of events to score
+            :output_s3_uri: s3://bucket/prefix the job writes its results to
+            :role_arn:      IAM role the service assumes to read the input and write the output
+            :df:            Optional: a Pandas DataFrame of observations, uploaded to input_s3_uri first
+            :timestamp:     timestamp column of df
+            :entity_id:     The unique ID of your entity if known, used for every row of df
+            :job_id:        batch prediction job id, a random UUID is generated if not supplied
+            :wait:          poll with backoff until the job has finished
+            :timeout:       seconds to wait for the job before raising TimeoutError
+
+        Returns:
+            :job:           get_batch_prediction_jobs entry of the job, e.g. {'jobId': ..., 'status': 'COMPLETE', ...}
+        """
+        bucket, key = self._split_s3_uri(input_s3_uri)
+        self._split_s3_uri(output_s3_uri)
+        if df is not None:
+            if timestamp is None or timestamp not in df.columns:
+                raise ValueError("batch_predict_job: timestamp must name a column of df, got {!r}".format(timestamp))
+            if not key:
+                raise ValueError("batch_predict_job: input_s3_uri {!r} needs an object key to upload df to".format(
+                    input_s3_uri))
+            # the job reads the frame as a whole - keep it columnar instead of going through per-row dicts
+            timestamps, events = self._dataframe_columns(timestamp, df)
+            events.insert(0, 'EVENT_ID', self._event_ids(len(events)))
+            events.insert(1, 'EVENT_TIMESTAMP', timestamps.to_numpy())
+            events.insert(2, 'ENTITY_ID', entity_id)
+            events.insert(3, 'ENTITY_TYPE', self.entity_type)
+            self.s3.put_object(Bucket=bucket, Key=key, Body=events.to_csv(index=False).encode("utf-8"))
+
+        job_id = job_id or str(uuid.uuid4())
+        self.fd.create_batch_prediction_job(
+            jobId=job_id,
+            inputPath=input_s3_uri,
+            outputPath=output_s3_uri,
+            eventTypeName=self.event_type,
+            detectorName=self.detector_name,
+            detectorVersion=self.detector_version,
+            iamRoleArn=role_arn
         )
-        return rules['ruleDetails']
+        lh.info("batch_predict_job: job {} created".format(job_id))
 
+        deadline = time.monotonic() + timeout
+        delay = 10
+        while True:
+            job = self.fd.get_batch_prediction_jobs(jobId=job_id)['batchPredictions'][0]
+            if not wait or job['status'] in ('COMPLETE', 'FAILED', 'CANCELED'):
+                return job
+            if time.monotonic() >= deadline:
+                raise TimeoutError("Batch prediction job {} still {} after {}s".format(job_id, job['status'], timeout))
+            lh.info("batch_predict_job: job {} is {}".format(job_id, job['status']))
+            time.sleep(delay * random.uniform(0.8, 1.2))
+            delay = min(120, delay * 1.5)
 
-    def create_rules(self, rules):
+
+    @property
+    def rules(self):
+        """list of rules associated with this instance's detector"""
+        return self._get_rules()
+
+    def _get_rules(self, force_refresh=False):
+        """Fetch the rules of this instance's detector once and reuse them until create/delete rules invalidates"""
+        if self._rules_cache is None or force_refresh:
+            self._rules_cache = self._paginate('get_rules', 'ruleDetails', detectorId=self.detector_name)['ruleDetails']
+            # create_detector_version only accepts these keys - build the references once per fetch, not per deploy
+            det = self.detector_name
+            self._rule_refs = [{'detectorId': r.get('detectorId', det), 'ruleId': r['ruleId'], 'ruleVersion': r['ruleVersion']}
+                               for r in self._rules_cache]
+        return self._rules_cache
+
+    def _get_rule_refs(self, force_refresh=False):
+        """{detectorId, ruleId, ruleVersion} references to this detector's rules, as create_detector_version takes them"""
+        self._get_rules(force_refresh=force_refresh)
+        return self._rule_refs
+
+
+    @staticmethod
+    def _rule_id(rule):
+        """ruleId of a rule as handed in, None if it is not a dict"""
+        return rule.get('ruleId') if isinstance(rule, dict) else None
+
+    @staticmethod
+    def _validate_rule(rule, required=('ruleId', 'expression', 'outcomes')):
+        """True if rule carries the non-empty fields the rule APIs need, checked before any API call is made"""
+        if not isinstance(rule, dict):
+            return False
+        for key in required:
+            value = rule.get(key)
+            if key == 'outcomes':
+                if not (isinstance(value, list) and value and all(isinstance(o, str) and o for o in value)):
+                    return False
+            elif key == 'ruleVersion':
+                if not (isinstance(value, (str, int)) and str(value).strip()):
+                    return False
+            elif not (isinstance(value, str) and value.strip()):
+                return False
+        return True
+
+    def create_rules(self, rules, max_workers=None, chunk_size=50):
         """Create rules by passing in a list of dictionaries with expressions and outcomes they map to
         Args:
 
@@ -786,80 +1193,236 @@ class FraudDetector:
                                 },
                              {'ruleId': 'name-of-next-rule'...
                             ]
+            :max_workers:    number of concurrent create_rule calls, defaults to the instance max_workers
+            :chunk_size:     rules sent per chunk; progress is logged per chunk and throttled rules are sent again
+                             after a backoff
         https://docs.aws.amazon.com/frauddetector/latest/ug/rule-language-reference.html
+
+        Returns:
+            :results:        [RuleOpResult, ...] in input order. Rules missing a ruleId, expression or outcomes
+                             are not sent (SKIPPED_INVALID), nor are repeats of a ruleId already in the list
+                             (SKIPPED_DUPLICATE); rules that already exist are SKIPPED_EXISTS, failed calls carry
+                             the exception
         """
         # ToDo Checks: rules map to existing outcomes
-        responses = []
         try:
-            existing_rules = [r['ruleId'] for r in self.rules]
-        except KeyError:
+            existing_rules = {r['ruleId'] for r in self.rules}
+        except (KeyError, TypeError):
             lh.info("create_rules: No pre-existing rules found")
+            existing_rules = set()
+
+        # the status each rule is skipped with, None for the rules to create
+        statuses = []
+        seen = set()
         for rule in rules:
-            if rule['ruleId'] not in existing_rules:
-                response = self.fd.create_rule(
+            if not self._validate_rule(rule):
+                statuses.append(RuleOpResult.SKIPPED_INVALID)
+                continue
+            if rule['ruleId'] in seen:
+                statuses.append(RuleOpResult.SKIPPED_DUPLICATE)
+            elif rule['ruleId'] in existing_rules:
+                lh.warning("create_rules: rule {} already exists, skipping".format(rule['ruleId']))
+                statuses.append(RuleOpResult.SKIPPED_EXISTS)
+            else:
+                statuses.append(None)
+            seen.add(rule['ruleId'])
+        skipped_invalid = [self._rule_id(r) for r, s in zip(rules, statuses) if s == RuleOpResult.SKIPPED_INVALID]
+        if skipped_invalid:
+            lh.warning("create_rules: skipping {} invalid rule(s): {}".format(len(skipped_invalid), skipped_invalid))
+        duplicates = [r['ruleId'] for r, s in zip(rules, statuses) if s == RuleOpResult.SKIPPED_DUPLICATE]
+        if duplicates:
+            lh.warning("create_rules: skipping duplicate rule id(s) in input: {}".format(duplicates))
+
+        det = self.detector_name
+        create = self.fd.create_rule
+
+        def _create_one(item):
+            rule, status = item
+            if status is not None:
+                return RuleOpResult(self._rule_id(rule), status)
+            try:
+                response = create(
                     ruleId=rule['ruleId'],
-                    detectorId=self.detector_name,
-                    description="Rule: " + rule['ruleId'] + " for outcomes " + str(rule['outcomes']),
+                    detectorId=det,
+                    description=f"Rule: {rule['ruleId']} for outcomes {rule['outcomes']}",
                     expression=rule['expression'],
                     outcomes=rule['outcomes'],
                     language="DETECTORPL"
                 )
-                responses.append(response)
-            else:
-                lh.warning("create_rules: rule {} already exists, skipping".format(rule['ruleId']))
-                responses.append("skipped")
+                return RuleOpResult(rule['ruleId'], RuleOpResult.CREATED, response)
+            except Exception as e:
+                lh.warning("create_rules: " + str(e))
+                return RuleOpResult(rule['ruleId'], RuleOpResult.FAILED, e)
 
+        # rule creations are independent round-trips - issue them concurrently, responses keep input order
+        responses = self._map_rule_chunks(_create_one, zip(rules, statuses), chunk_size,
+                                          max_workers=max_workers, label="create_rules")
+        self._rules_cache = None
         return responses
 
-    def delete_rules(self, rules):
+    def _referenced_rule_versions(self):
+        """{(ruleId, ruleVersion)} used by any ACTIVE or INACTIVE version of this detector"""
+        try:
+            summaries = self._paginate('describe_detector', 'detectorVersionSummaries',
+                                       detectorId=self.detector_name)['detectorVersionSummaries']
+        except self.fd.exceptions.ResourceNotFoundException:
+            return set()
+        version_ids = [s['detectorVersionId'] for s in summaries if s.get('status') in ('ACTIVE', 'INACTIVE')]
+
+        def _rules_of(version_id):
+            return self.fd.get_detector_version(detectorId=self.detector_name,
+                                                detectorVersionId=version_id).get('rules', [])
+
+        return {(r['ruleId'], str(r['ruleVersion']))
+                for version_rules in self._map_concurrent(_rules_of, version_ids)
+                for r in version_rules}
+
+    def delete_rules(self, rules, max_workers=None, chunk_size=50):
         """delete a set of rules (cannot delete a rule if it is used by an ACTIVE or INACTIVE detector version)
         Args:
 
-            :rules:  JSON structure of rules associated with detector
-        """
+            :rules:        JSON structure of rules associated with detector
+            :max_workers:  number of concurrent delete_rule calls, defaults to the instance max_workers
+            :chunk_size:   rules sent per chunk; progress is logged per chunk and throttled rules are sent again
+                           after a backoff
 
-        for r in rules:
+        Returns:
+            :results:      [RuleOpResult, ...] in input order. Rules without a ruleId or ruleVersion are not sent
+                           (SKIPPED_INVALID), nor are rule versions used by an ACTIVE or INACTIVE detector version
+                           (SKIPPED_IN_USE); failed calls carry the exception
+        """
+        rules = list(rules)
+        valid = [self._validate_rule(r, ('ruleId', 'ruleVersion')) for r in rules]
+        skipped_invalid = [self._rule_id(r) for r, ok in zip(rules, valid) if not ok]
+        if skipped_invalid:
+            lh.warning("delete_rules: skipping {} invalid rule(s): {}".format(len(skipped_invalid), skipped_invalid))
+        if not any(valid):
+            # nothing to delete - no need to look up the detector versions either
+            return [RuleOpResult(self._rule_id(r), RuleOpResult.SKIPPED_INVALID) for r in rules]
+
+        in_use = self._referenced_rule_versions()
+        # the status each rule is skipped with, None for the rules to delete
+        statuses = []
+        for r, ok in zip(rules, valid):
+            if not ok:
+                statuses.append(RuleOpResult.SKIPPED_INVALID)
+            elif (r['ruleId'], str(r['ruleVersion'])) in in_use:
+                statuses.append(RuleOpResult.SKIPPED_IN_USE)
+            else:
+                statuses.append(None)
+        skipped_in_use = [r['ruleId'] for r, s in zip(rules, statuses) if s == RuleOpResult.SKIPPED_IN_USE]
+        if skipped_in_use:
+            lh.warning("delete_rules: skipping rule(s) used by an ACTIVE or INACTIVE detector version: {}".format(
+                skipped_in_use))
+
+        det = self.detector_name
+        delete = self.fd.delete_rule
+
+        def _delete_one(item):
+            r, status = item
+            if status is not None:
+                return RuleOpResult(self._rule_id(r), status)
             try:
-                response = self.fd.delete_rule(
-                    rule={'detectorId': self.detector_name, 'ruleId': r['ruleId'], 'ruleVersion': r['ruleVersion']}
-                )
+                response = delete(rule={'detectorId': det, 'ruleId': r['ruleId'], 'ruleVersion': r['ruleVersion']})
+                return RuleOpResult(r['ruleId'], RuleOpResult.DELETED, response)
             except Exception as e:
                 lh.warning("delete_rules: " + str(e))
-
-    def deploy(self, rules_list=None, rule_execution_mode='FIRST_MATCHED'):
+                return RuleOpResult(r['ruleId'], RuleOpResult.FAILED, e)
+
+        results = self._map_rule_chunks(_delete_one, zip(rules, statuses), chunk_size,
+                                        max_workers=max_workers, label="delete_rules")
+        self._rules_cache = None
+        return results
+
+    @staticmethod
+    def _deploy_signature(rules, model_versions, rule_execution_mode):
+        """Order-independent fingerprint of a detector version's rules, model versions and execution mode"""
+        return (tuple(sorted((r['ruleId'], str(r['ruleVersion'])) for r in rules)),
+                tuple(sorted((m['modelId'], m['modelType'], str(m['modelVersionNumber'])) for m in model_versions)),
+                rule_execution_mode)
+
+    def _latest_detector_version(self):
+        """Details (rules, modelVersions, ...) of the highest-numbered version of this detector, None if there is none"""
+        try:
+            summaries = self._paginate('describe_detector', 'detectorVersionSummaries',
+                                       detectorId=self.detector_name)['detectorVersionSummaries']
+        except self.fd.exceptions.ResourceNotFoundException:
+            return None
+        if not summaries:
+            return None
+        latest = max(summaries, key=lambda s: int(s['detectorVersionId']))
+        return self.fd.get_detector_version(detectorId=self.detector_name,
+                                            detectorVersionId=latest['detectorVersionId'])
+
+    def _wait_for_model_active(self, poll_interval=15.0, timeout=1800.0):
+        """Poll model_status with backoff until the model-version is ACTIVE, TimeoutError after timeout seconds.
+        A missing or failed model-version never becomes ACTIVE, so it raises EnvironmentError straight away"""
+        deadline = time.monotonic() + timeout
+        delay = min(poll_interval, 60)
+        status = self.model_status
+        while status != 'ACTIVE':
+            if status is None or status in ('TRAINING_FAILED', 'ERROR'):
+                raise EnvironmentError("Model {} version {} cannot become active (status: {})".format(
+                    self.model_name, self.model_version, status))
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Model not active after {}s (status: {})".format(timeout, status))
+            lh.info("deploy: model status is {}, waiting for ACTIVE".format(status))
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 1.5, 60)
+            status = self.model_status
+
+    def deploy(self, rules_list=None, rule_execution_mode='FIRST_MATCHED', force=False,
+               wait_for_model=False, poll_interval=15.0, timeout=1800.0):
         """Deploy a detector-version with associated rules for a particular model version
 
         Args:
 
             :rules_list:  Optional: if a list of rules is supplied, call the create_rules method, otherwise work with existing rules
                      pass in list of (rule_name, expression, [outcomes]) tuples
+            :force:       create a new detector-version even if the latest one already has the same rules and model
+            :wait_for_model:  poll until the model-version is ACTIVE instead of raising straight away
+            :poll_interval:   first wait between polls in seconds, grows 1.5x per poll up to 60s
+            :timeout:         seconds to wait for the model before raising TimeoutError
 
+        Returns:
+            :response:    create_detector_version response, or {'status': 'unchanged', 'detectorVersionId': ...} when
+                          the latest detector-version already matches
         """
 
         # Check model-version is ACTIVE
-        if self.model_status != 'ACTIVE':
+        if wait_for_model:
+            self._wait_for_model_active(poll_interval=poll_interval, timeout=timeout)
+        elif self.model_status != 'ACTIVE':
             lh.warning("deploy: Model is not active; wait until model is active before deploying")
             raise EnvironmentError("Model not active")
 
         # create rules, if supplied, then get all the rules associated with this detector instance
         if rules_list:
-            response = self.create_rules(rules_list)
-        active_rules = self.rules
-
-        # create a rules list of dicts to pass in to create detector version
-        rules_payload = []
-        for r in active_rules:
-            rules_payload.append({'detectorId': self.detector_name, 'ruleId': r['ruleId'], 'ruleVersion': r['ruleVersion'] })
+            self.create_rules(rules_list)
+        rules_payload = self._get_rule_refs()
+
+        model_versions = [{
+            'modelId': self.model_name,
+            'modelType': self.model_type,
+            'modelVersionNumber': self.model_version
+            }]
+
+        # skip the version bump if the latest detector-version already deploys exactly these rules and model
+        signature = self._deploy_signature(rules_payload, model_versions, rule_execution_mode)
+        if not force:
+            latest = self._latest_detector_version()
+            if latest is not None and signature == self._deploy_signature(latest.get('rules', []),
+                                                                          latest.get('modelVersions', []),
+                                                                          latest.get('ruleExecutionMode')):
+                lh.info("deploy: detector-version {} is unchanged, skipping".format(latest['detectorVersionId']))
+                return {'status': 'unchanged', 'detectorVersionId': latest['detectorVersionId']}
 
         # deploy the detector-version with rules and model
         response = self.fd.create_detector_version(
             detectorId=self.detector_name,
             rules=rules_payload,
-            modelVersions=[{
-                'modelId': self.model_name,
-                'modelType': self.model_type,
-                'modelVersionNumber': self.model_version
-                }],
+            modelVersions=model_versions,
             ruleExecutionMode=rule_execution_mode
         )
         return response
@@ -872,76 +1435,76 @@ class FraudDetector:
         return response
 
     def create_new_rule_version(self, rule_object, language='DETECTORPL'):
-         """Create new version of an existing rule
-
-         Args:
-             :rule_object:   Dictionary containing  ruleId, expression, outcomes and ruleVersion for new rule to be created
-
-             Example of rule_object:
-             {
-              'ruleId': 'high_fraud_risk',
-              'expression': '$registration_model_jan_insightscore > 900',
-              'outcomes': ['verify_outcome'],
-              'ruleVersion': '3'
-              }
-
-         Returns:
-             :response:   dict with metadata on the created rule
-         """
-
-         response = self.fd.update_rule_version(
-             rule={
-                 'detectorId': self.detector_name,
-                 'ruleId': rule_object['ruleId'],
-                 'ruleVersion': rule_object['ruleVersion']
-             },
-             description="Rule: " + rule_object['ruleId'] + " for outcomes " + str(rule_object['outcomes']),
-             expression=rule_object['expression'],
-             language=language,
-             outcomes=rule_object['outcomes']
-         )
-         return response
-
-     def create_new_detector_version(self, detector_rules_to_attach, ruleExecutionMode='FIRST_MATCHED'):
-         """Create new version of a detector with a specific set uf rules
-
-         Args:
-             :detector_rules_to_attach:   List of dictionaries, each dict containing ruleId, ruleVersion to attach to detector
-
-             Example of detector_rules_to_attach:
-
-                 [{
-                     'ruleId': 'high_fraud_risk',
-                     'ruleVersion': '3'
-                 },
-                 {
-                     'ruleId': 'low_fraud_risk',
-                     'ruleVersion': '1'
-                 },
-                 {
-                     'ruleId': 'no_fraud_risk',
-                     'ruleVersion': '1'
-                 }]
-
-         Returns:
-             :response:   dict with metadata on the created detector version
-         """
-         detector_rules = []
-         for rule in detector_rules_to_attach:
-             rule['detectorId'] = self.detector_name
-             detector_rules.append(rule)
-
-         response = self.fd.create_detector_version(
-             detectorId=self.detector_name,
-             rules=detector_rules,
-             modelVersions=[{
-                 'modelId': self.model_name,
-                 'modelType': self.model_type,
-                 'modelVersionNumber': self.model_version
-             }],
-             ruleExecutionMode=ruleExecutionMode
-         )
-         return response
+        """Create new version of an existing rule
+
+        Args:
+            :rule_object:   Dictionary containing  ruleId, expression, outcomes and ruleVersion for new rule to be created
+
+            Example of rule_object:
+            {
+             'ruleId': 'high_fraud_risk',
+             'expression': '$registration_model_jan_insightscore > 900',
+             'outcomes': ['verify_outcome'],
+             'ruleVersion': '3'
+             }
+
+        Returns:
+            :response:   dict with metadata on the created rule
+        """
+
+        response = self.fd.update_rule_version(
+            rule={
+                'detectorId': self.detector_name,
+                'ruleId': rule_object['ruleId'],
+                'ruleVersion': rule_object['ruleVersion']
+            },
+            description=f"Rule: {rule_object['ruleId']} for outcomes {rule_object['outcomes']}",
+            expression=rule_object['expression'],
+            language=language,
+            outcomes=rule_object['outcomes']
+        )
+        # the new rule version shows up in get_rules - drop the cached listing
+        self._rules_cache = None
+        return response
+
+    def create_new_detector_version(self, detector_rules_to_attach, ruleExecutionMode='FIRST_MATCHED'):
+        """Create new version of a detector with a specific set uf rules
+
+        Args:
+            :detector_rules_to_attach:   List of dictionaries, each dict containing ruleId, ruleVersion to attach to detector
+
+            Example of detector_rules_to_attach:
+
+                [{
+                    'ruleId': 'high_fraud_risk',
+                    'ruleVersion': '3'
+                },
+                {
+                    'ruleId': 'low_fraud_risk',
+                    'ruleVersion': '1'
+                },
+                {
+                    'ruleId': 'no_fraud_risk',
+                    'ruleVersion': '1'
+                }]
+
+        Returns:
+            :response:   dict with metadata on the created detector version
+        """
+        # shallow copies - the caller's rule dicts are left untouched for reuse
+        detector_rules = [{**rule, 'detectorId': self.detector_name} for rule in detector_rules_to_attach]
+
+        response = self.fd.create_detector_version(
+            detectorId=self.detector_name,
+            rules=detector_rules,
+            modelVersions=[{
+                'modelId': self.model_name,
+                'modelType': self.model_type,
+                'modelVersionNumber': self.model_version
+            }],
+            ruleExecutionMode=ruleExecutionMode
+        )
+        return response
 
 
 
@@ -13,12 +13,12 @@
 #   limitations under the License.
 
 import json
-
-import boto3
 import pandas as pd
 import seaborn as sns
 from matplotlib import pyplot as plt
 
+from .frauddetector import _get_client
+
 
 class Metrics:
     """Return metrics for a given Amazon Fraud Detector project.
@@ -29,7 +29,7 @@ class Metrics:
 
     """
 
-    def __init__(self, project_name):
+    def __init__(self, project_name, region=None):
         """Creates a Metrics object for Amazon Fraud Detector.
         It can retrieve key metrics, namely precision, recall and f1 score
         from a given Amazon Fraud Detector project.
@@ -39,9 +39,10 @@ class Metrics:
 
         Args:
             project_name (str): Name of the Amazon Fraud Detector to interact with.
+            region (str): AWS region of the project, by default the one configured for boto3
 
         """
         super(Metrics, self).__init__()
         self.project_name = project_name
-        self.fd = boto3.client("frauddetector")
-        self.s3 = boto3.client("s3")
+        self.fd = _get_client("frauddetector", region)
+        self.s3 = _get_client("s3", region)
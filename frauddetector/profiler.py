@@ -16,15 +16,24 @@ import inspect
 import json
 import logging
 import os
+import re
+import sys
 import time
 import warnings
+import weakref
 from collections import defaultdict
 from multiprocessing.pool import ThreadPool
 
-import boto3
 import pandas as pd
 import numpy as np
 
+from .frauddetector import _get_client
+
+# feature-name patterns for the address variable types, compiled once for every profiling run
+_EMAIL_RE = re.compile("email|email_address|emailaddr")
+_IP_RE = re.compile("ipaddress|ip_address|ipaddr")
+
+
 class Profiler:
     """Profiler class to build, train and deploy.
 
@@ -37,37 +46,72 @@ class Profiler:
 
     """
 
-    def __init__(self):
+    def __init__(self, region=None):
         """Build, train and deploy Amazon Fraud Detector models.
 
         Technical documentation on how Amazon Fraud Detector works can be
         found at: https://aws.amazon.com/lookout-for-vision/
 
         Args:
-            None
+            region (str): AWS region of the s3 client, by default the one configured for boto3
 
         """
-        self.s3 = boto3.client("s3")
+        self.s3 = _get_client("s3", region)
+        # (weakref to data, shape, columns, event_column, stats table) of the last get_summary_stats_table call
+        self._stats_cache = None
+
+    def reset(self):
+        """Forget the cached summary stats, e.g. after modifying a DataFrame in place that was already profiled"""
+        self._stats_cache = None
 
-    def __calculate_summary_stats(self, data, event_column="EVENT_LABEL"):
+    @staticmethod
+    def __numeric_count_nunique(values):
+        """(count, nunique) of one numeric column: drop the NaNs, sort, count the value changes"""
+        if values.dtype.kind == 'f':
+            values = values[~np.isnan(values)]
+        if not len(values):
+            return 0, 0
+        values = np.sort(values)
+        return len(values), int(np.count_nonzero(values[1:] != values[:-1])) + 1
+
+    def __calculate_summary_stats(self, data, event_column="EVENT_LABEL", fast=False):
         """ Generate summary statistics for a panda's data frame 
             
             Args:
                 data (pandas.core.frame.DataFrame): panda's dataframe to create summary statistics for
                 event_column (str): column that contains the target event
+                fast (bool): count the numeric columns with numpy on a thread per core instead of pandas agg
             Returns:
                 df_stats (pandas.core.frame.DataFrame): DataFrame of summary statistics, training data schema, event variables and event lables
         """
-        df = data.copy("deep")
+        # shallow copy - only the event column is replaced, the caller's frame and other columns are left alone
+        df = data.copy(deep=False)
         rowcnt = len(df)
         df[event_column] = df[event_column].astype('str', errors='ignore')
-        df_s1  = df.agg(['count', 'nunique']).transpose().reset_index().rename(columns={"index":"feature_name"})
+        if fast:
+            # numpy dtypes only - nullable extension dtypes (Int64, boolean) hold pd.NA, which numpy can't sort
+            numeric = [c for c, dtype in df.dtypes.items() if isinstance(dtype, np.dtype) and dtype.kind in 'biuf']
+            others = [c for c in df.columns if c not in set(numeric)]
+            stats = {}
+            if numeric:
+                # np.sort releases the GIL, so the numeric columns are counted in parallel
+                with ThreadPool(min(len(numeric), os.cpu_count() or 1)) as pool:
+                    stats.update(zip(numeric, pool.map(self.__numeric_count_nunique,
+                                                       [df[c].to_numpy() for c in numeric])))
+            if others:
+                agg = df[others].agg(['count', 'nunique'])
+                stats.update((c, (agg.at['count', c], agg.at['nunique', c])) for c in others)
+            df_s1 = pd.DataFrame([(c,) + tuple(stats[c]) for c in df.columns],
+                                 columns=["feature_name", "count", "nunique"])
+        else:
+            df_s1  = df.agg(['count', 'nunique']).transpose().reset_index().rename(columns={"index":"feature_name"})
         df_s1["null"] = (rowcnt - df_s1["count"]).astype('int64')
         df_s1["not_null"] = rowcnt - df_s1["null"]
         df_s1["null_pct"] = df_s1["null"] / rowcnt
         df_s1["nunique_pct"] = df_s1['nunique']/ rowcnt
-        dt = pd.DataFrame(df.dtypes).reset_index().rename(columns={"index":"feature_name", 0:"dtype"})
-        df_stats = pd.merge(dt, df_s1, on='feature_name', how='inner').round(4)
+        # agg keeps the column order, so the dtypes line up positionally - no join needed
+        df_s1.insert(1, "dtype", df.dtypes.to_numpy())
+        df_stats = df_s1.round(4)
         df_stats['nunique'] = df_stats['nunique'].astype('int64')
         df_stats['count'] = df_stats['count'].astype('int64')
         return df_stats
@@ -80,14 +124,18 @@ class Profiler:
             Returns:
                 df_types (pandas.core.frame.DataFrame): DataFrame with mapping
         """
-        df_types = df_stats.copy("deep")
-        df_types['feature_type'] = "UNKOWN"
-        df_types.loc[df_types["dtype"] == object, 'feature_type'] = "CATEGORY"
-        df_types.loc[(df_types["dtype"] == "int64") | (df_types["dtype"] == "float64"), 'feature_type'] = "NUMERIC"
-        df_types.loc[df_types["feature_name"].str.contains("ipaddress|ip_address|ipaddr"), 'feature_type'] = "IP_ADDRESS"
-        df_types.loc[df_types["feature_name"].str.contains("email|email_address|emailaddr"), 'feature_type'] = "EMAIL_ADDRESS"
-        df_types.loc[df_types["feature_name"] == "EVENT_LABEL", 'feature_type'] = "TARGET"
-        df_types.loc[df_types["feature_name"] == "EVENT_TIMESTAMP", 'feature_type'] = "EVENT_TIMESTAMP"
+        df_types = df_stats  # freshly built by __calculate_summary_stats, annotated in place
+        names = df_types["feature_name"]
+        # np.select takes the first matching condition - highest priority first
+        df_types['feature_type'] = np.select(
+            [names == "EVENT_TIMESTAMP",
+             names == "EVENT_LABEL",
+             names.str.contains(_EMAIL_RE),
+             names.str.contains(_IP_RE),
+             (df_types["dtype"] == "int64") | (df_types["dtype"] == "float64"),
+             df_types["dtype"] == object],
+            ["EVENT_TIMESTAMP", "TARGET", "EMAIL_ADDRESS", "IP_ADDRESS", "NUMERIC", "CATEGORY"],
+            default="UNKOWN")
         return df_types
     
     def __screen_for_warnings(self, df_types):
@@ -98,13 +146,20 @@ class Profiler:
             Returns:
                 df_warn (pandas.core.frame.DataFrame): DataFrame with added warnings
         """
-        df_warn = df_types.copy("deep")
-        df_warn['feature_warning'] = "NO WARNING"
-        df_warn.loc[(df_warn["nunique"] != 2) & (df_warn["feature_name"] == "EVENT_LABEL"),'feature_warning' ] = "LABEL WARNING, NON-BINARY EVENT LABEL"
-        df_warn.loc[(df_warn["nunique_pct"] > 0.9) & (df_warn['feature_type'] == "CATEGORY") ,'feature_warning' ] = "EXCLUDE, GT 90% UNIQUE"
-        df_warn.loc[(df_warn["null_pct"] > 0.2) & (df_warn["null_pct"] <= 0.5), 'feature_warning' ] = "NULL WARNING, GT 20% MISSING"
-        df_warn.loc[df_warn["null_pct"] > 0.5,'feature_warning' ] = "EXCLUDE, GT 50% MISSING"
-        df_warn.loc[((df_warn['dtype'] == "int64" ) | (df_warn['dtype'] == "float64" ) ) & (df_warn['nunique_pct'] < 0.2), 'feature_warning' ] = "LIKELY CATEGORICAL, NUMERIC w. LOW CARDINALITY"
+        df_warn = df_types  # annotated in place, see __map_feature_types
+        # np.select takes the first matching condition - highest priority first
+        df_warn['feature_warning'] = np.select(
+            [((df_warn['dtype'] == "int64") | (df_warn['dtype'] == "float64")) & (df_warn['nunique_pct'] < 0.2),
+             df_warn["null_pct"] > 0.5,
+             (df_warn["null_pct"] > 0.2) & (df_warn["null_pct"] <= 0.5),
+             (df_warn["nunique_pct"] > 0.9) & (df_warn['feature_type'] == "CATEGORY"),
+             (df_warn["nunique"] != 2) & (df_warn["feature_name"] == "EVENT_LABEL")],
+            ["LIKELY CATEGORICAL, NUMERIC w. LOW CARDINALITY",
+             "EXCLUDE, GT 50% MISSING",
+             "NULL WARNING, GT 20% MISSING",
+             "EXCLUDE, GT 90% UNIQUE",
+             "LABEL WARNING, NON-BINARY EVENT LABEL"],
+            default="NO WARNING")
         return df_warn
 
     def __create_labels(self, data, event_column):
@@ -116,9 +171,9 @@ class Profiler:
             Returns:
                 label_list (list): List of dicts with label names
         """
-        if len(data[event_column].unique()) > 2:
-            logging.error(f"Target column {event_column} has more than 2 unique values! Please review your data and fix the {event_column} content!")
         labels = data[event_column].unique().tolist()
+        if len(labels) > 2:
+            logging.error(f"Target column {event_column} has more than 2 unique values! Please review your data and fix the {event_column} content!")
         label_list = [{"name": x} for x in labels]
         return label_list
 
@@ -132,16 +187,18 @@ class Profiler:
                 variables (list): List of dicts with variable names
         """
         variables = []
-        for i in range(df_stats.shape[0]):
-            if df_stats.loc[i, "feature_name"] not in [event_column, timestamp_column]:
+        reserved = {event_column, timestamp_column}
+        # plain tuples instead of two .loc lookups per field per row
+        for feature_name, feature_type in df_stats[["feature_name", "feature_type"]].itertuples(index=False, name=None):
+            if feature_name not in reserved:
                 data_type = "STRING"
                 default_value = "unknown"
-                if df_stats.loc[i, "feature_type"] == "NUMERIC":
+                if feature_type == "NUMERIC":
                     data_type = "FLOAT"
                     default_value = 0.0
                 variables.append({
-                    "name": str(df_stats.loc[i, "feature_name"]),
-                    "variableType": df_stats.loc[i, "feature_type"],
+                    "name": str(feature_name),
+                    "variableType": feature_type,
                     "dataType": data_type,
                     "defaultValue": "unknown"
                 })
@@ -169,22 +226,28 @@ class Profiler:
             column_in_df = False
         return column_in_df
     
-    def get_summary_stats_table(self, data, event_column="EVENT_LABEL", timestamp_column="EVENT_TIMESTAMP"):
+    def get_summary_stats_table(self, data, event_column="EVENT_LABEL", timestamp_column="EVENT_TIMESTAMP", fast=False):
         """Get a summary stats table with variable warnings
             
             Args:
                 data (pandas.core.frame.DataFrame): panda's dataframe to create summary statistics for
                 event_column (str): column that contains the target event
                 timestamp_column (str): column that contains the timestamp
+                fast (bool): count numeric columns with numpy in parallel threads, same table for large frames faster
             Returns:
                 df (pandas.core.frame.DataFrame): DataFrame of summary statistics, training data schema, event variables and event lables
         """
         if not self.__check_column_in_dataframe(data=data, event_column=event_column, timestamp_column=timestamp_column):
             sys.exit("Please fix your column labels!")
-        df = data.copy("deep")
-        df = self.__calculate_summary_stats(data, event_column=event_column)
+        # the same frame is often profiled twice (stats table, then get_frauddetector_inputs) - reuse the last result
+        key = (data.shape, tuple(data.columns), event_column)
+        cached = self._stats_cache
+        if cached is not None and cached[0]() is data and cached[1:4] == key:
+            return cached[4].copy()
+        df = self.__calculate_summary_stats(data, event_column=event_column, fast=fast)
         df = self.__map_feature_types(df_stats=df)
         df = self.__screen_for_warnings(df_types=df)
+        self._stats_cache = (weakref.ref(data),) + key + (df.copy(),)
         return df
     
     def __extract_frauddetector_schema(self, data, df_warn, event_column="EVENT_LABEL", timestamp_column="EVENT_TIMESTAMP", filter_warnings=False):
@@ -202,18 +265,20 @@ class Profiler:
             Returns:
                 data_schema (dict): The training data schema for AFD
         """
-        df = df_warn.copy("deep")
+        df = df_warn
         if filter_warnings:
-            df = df[(df['feature_warning'] != 'NO WARNING')].reset_index(drop=True)
+            # keep only the features that passed screening
+            df = df.loc[df['feature_warning'] == 'NO WARNING'].reset_index(drop=True)
         variables = self.__create_variables(df_stats=df, event_column=event_column, timestamp_column=timestamp_column)
         labels = self.__create_labels(data=data, event_column=event_column)
+        label_counts = data[event_column].value_counts()  # one counting pass for both the rarest and commonest label
 
         data_schema = {
             'modelVariables' : df.loc[(df['feature_type'].isin(['IP_ADDRESS', 'EMAIL_ADDRESS', 'CATEGORY', 'NUMERIC']))]['feature_name'].to_list(),
             'labelSchema'    : {
                 'labelMapper' : {
-                    'FRAUD' : [data[event_column].value_counts().idxmin()],
-                    'LEGIT' : [data[event_column].value_counts().idxmax()]
+                    'FRAUD' : [label_counts.idxmin()],
+                    'LEGIT' : [label_counts.idxmax()]
                 }
             }
         }
@@ -236,8 +301,7 @@ class Profiler:
         """
         if not self.__check_column_in_dataframe(data=data, event_column=event_column, timestamp_column=timestamp_column):
             sys.exit("Please fix your column labels!")
-        df = data.copy("deep")
-        df_warn = self.get_summary_stats_table(data=df, event_column=event_column)
+        df_warn = self.get_summary_stats_table(data=data, event_column=event_column)
         return self.__extract_frauddetector_schema(
             data=data,
             df_warn=df_warn,
@@ -13,9 +13,10 @@ setup(
     author_email="bullee@amazon.com, zolliko@amazon.ch, wallnm@amazon.com",
     license="Apache-2.0",
     install_requires=["numpy", "pandas", "boto3", "scikit-image", "seaborn", "matplotlib", "ipython"],
+    extras_require={"async": ["aioboto3"]},
     url="",
     setup_requires=["pytest-runner"],
-    tests_require=["pytest==4.4.1"],
+    tests_require=["pytest==4.4.1", "moto>=5", "aioboto3"],
     test_suite="tests",
     long_description=long_description,
     long_description_content_type="text/markdown",
@@ -0,0 +1,120 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+#   Licensed under the Apache License, Version 2.0 (the "License").
+#   You may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+
+#       http://www.apache.org/licenses/LICENSE-2.0
+
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+import numpy as np
+import pandas as pd
+from pandas._testing import assert_frame_equal
+import pytest
+from moto import mock_aws
+
+from frauddetector import frauddetector, profiler
+from .fake_frauddetector import InMemoryFraudDetector
+
+lh = logging.getLogger('conftest')
+
+MODEL_VERSION = "1"
+# PYTEST_FAST=1 trades assert_frame_fast's detailed failure diff for plain column-wise array comparisons
+PYTEST_FAST = os.environ.get("PYTEST_FAST") == "1"
+
+
+def assert_frame_fast(left, right):
+    """assert_frame_equal with a vectorized fast path: frames whose columns, dtypes and per-row hashes all match
+    are equal, anything else falls through to assert_frame_equal for its detailed diff"""
+    if PYTEST_FAST:
+        assert list(left.columns) == list(right.columns)
+        for col in right.columns:
+            np.testing.assert_array_equal(left[col].to_numpy(), right[col].to_numpy(), err_msg=col)
+        return
+    if (left.shape == right.shape and left.columns.equals(right.columns) and left.dtypes.equals(right.dtypes)
+            and np.array_equal(pd.util.hash_pandas_object(left).to_numpy(),
+                               pd.util.hash_pandas_object(right).to_numpy())):
+        return
+    assert_frame_equal(left, right)
+
+
+@pytest.fixture(scope="session")
+def aws():
+    """Keep every AWS call in-process: moto serves IAM/S3, frauddetector goes to the in-memory backend"""
+    with mock_aws():
+        yield
+
+
+@pytest.fixture(scope="session")
+def boto_session(aws):
+    """One boto3 session for every FraudDetector the tests build, credentials and config are resolved once"""
+    return boto3.session.Session(region_name='eu-west-1')
+
+
+@pytest.fixture(scope="session")
+def iam_client(boto_session):
+    return boto_session.client('iam')
+
+
+@pytest.fixture(scope="session")
+def aws_reachable(iam_client):
+    """One list_account_aliases round-trip per test session proves the credentials and endpoint work"""
+    response = iam_client.list_account_aliases()
+    assert response['ResponseMetadata']['HTTPStatusCode'] == 200
+    return response
+
+
+@pytest.fixture(scope="session")
+def backend(aws):
+    """The in-memory frauddetector backend, tests attach their detector's client and add canned responses to it"""
+    backend = InMemoryFraudDetector()
+    yield backend
+    backend.detach_all()
+
+
+@pytest.fixture(scope="session")
+def fd(backend, boto_session):
+    """One FraudDetector test project shared by every test, torn down after the last one"""
+    detector = frauddetector.FraudDetector(model_version=MODEL_VERSION,
+                                           entity_type="test_transaction",
+                                           event_type="test_credit_card_transaction",
+                                           model_name="test_credit_card_model",
+                                           detector_name="test_credit_card_fraud_project",
+                                           model_type="ONLINE_FRAUD_INSIGHTS",
+                                           region='eu-west-1',
+                                           detector_version="1",
+                                           session=boto_session
+                                           )
+    backend.attach(detector.fd)
+    yield detector
+
+    lh.debug("session teardown: {}".format(detector.detector_name))
+    # the event type references the project's variables and labels, so note them before it goes
+    event_type = detector.get_event_type()
+    detector.delete_model()
+    detector.delete_event_type()
+    detector.delete_entity_type()
+    if event_type:
+        # variables and labels don't depend on each other - delete both sets at once, and surface a leaked
+        # resource instead of leaving it for the next run to trip over
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            futures = [ex.submit(detector.delete_variables, event_type[0]['eventVariables'], raise_on_error=True),
+                       ex.submit(detector.delete_labels, event_type[0]['labels'], raise_on_error=True)]
+            for f in futures:
+                f.result()
+
+
+@pytest.fixture(scope="module")
+def prof():
+    """One Profiler per test module - tests profile their own frames, so sharing its stats cache is safe"""
+    return profiler.Profiler()
@@ -0,0 +1,127 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+#   Licensed under the Apache License, Version 2.0 (the "License").
+#   You may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+
+#       http://www.apache.org/licenses/LICENSE-2.0
+
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import copy
+import json
+import threading
+
+from botocore.awsrequest import AWSResponse
+
+
+class InMemoryFraudDetector:
+    """In-process stand-in for the frauddetector calls made by the test-suite.
+
+    moto has no frauddetector backend, so these calls are answered from a dict through botocore's
+    before-call hook (the same hook placebo replays through) while moto serves IAM and S3.
+    Only the project resources the tests create and delete are modelled, anything else (e.g. predictions
+    of a pre-trained model) is replayed from the responses a test puts in canned.
+    """
+
+    # operation: (listing key, action, identifying request parameter)
+    OPERATIONS = {
+        'GetEntityTypes': ('entityTypes', 'list', None),
+        'PutEntityType': ('entityTypes', 'put', 'name'),
+        'DeleteEntityType': ('entityTypes', 'delete', 'name'),
+        'GetEventTypes': ('eventTypes', 'list', None),
+        'PutEventType': ('eventTypes', 'put', 'name'),
+        'DeleteEventType': ('eventTypes', 'delete', 'name'),
+        'GetVariables': ('variables', 'list', None),
+        'CreateVariable': ('variables', 'put', 'name'),
+        'DeleteVariable': ('variables', 'delete', 'name'),
+        'GetLabels': ('labels', 'list', None),
+        'PutLabel': ('labels', 'put', 'name'),
+        'DeleteLabel': ('labels', 'delete', 'name'),
+        'GetOutcomes': ('outcomes', 'list', None),
+        'PutOutcome': ('outcomes', 'put', 'name'),
+        'DeleteOutcome': ('outcomes', 'delete', 'name'),
+        'GetModels': ('models', 'list', None),
+        'CreateModel': ('models', 'put', 'modelId'),
+        'DeleteModel': ('models', 'delete', 'modelId'),
+        'GetRules': ('ruleDetails', 'list', None),
+        'CreateRule': ('ruleDetails', 'put', 'ruleId'),
+        'DeleteRule': ('ruleDetails', 'delete', 'ruleId'),
+        'DescribeDetector': ('detectorVersionSummaries', 'list', None),
+        'CreateDetectorVersion': ('detectorVersionSummaries', 'put', 'detectorVersionId'),
+        'GetDetectorVersion': ('detectorVersionSummaries', 'get', 'detectorVersionId'),
+        'DeleteDetectorVersion': ('detectorVersionSummaries', 'delete', 'detectorVersionId'),
+    }
+    # fields the service adds to a created resource
+    DEFAULTS = {'ruleDetails': {'ruleVersion': '1'}, 'detectorVersionSummaries': {'status': 'DRAFT'}}
+
+    def __init__(self):
+        self.resources = {key: {} for key, _, _ in self.OPERATIONS.values()}
+        # operation: response body returned as is, e.g. {'GetEventPrediction': {...}}, or a callable that builds
+        # it from the request
+        self.canned = {}
+        # operation: error code the call fails with, e.g. {'CreateRule': 'ValidationException'}
+        self.errors = {}
+        self.clients = []
+        self._lock = threading.Lock()
+
+    def attach(self, client):
+        """Route every frauddetector call of a boto3 client to this backend. FraudDetector instances share
+        their clients, so attaching the same client again is a no-op"""
+        if client not in self.clients:
+            client.meta.events.register('before-call.frauddetector', self._handle)
+            self.clients.append(client)
+        return self
+
+    def detach(self, client):
+        """Stop answering for a client"""
+        client.meta.events.unregister('before-call.frauddetector', self._handle)
+        self.clients.remove(client)
+
+    def detach_all(self):
+        for client in list(self.clients):
+            self.detach(client)
+
+    @staticmethod
+    def _response(status, body):
+        return AWSResponse('https://frauddetector.local', status, {}, None), dict(
+            body, ResponseMetadata={'HTTPStatusCode': status})
+
+    def _handle(self, model, params, **kwargs):
+        if model.name in self.errors:
+            return self._response(400, {'Error': {'Code': self.errors[model.name],
+                                                  'Message': '{} failed'.format(model.name)}})
+        if model.name in self.canned:
+            body = self.canned[model.name]
+            if callable(body):
+                return self._response(200, body(json.loads(params['body'] or b'{}')))
+            return self._response(200, copy.deepcopy(body))
+        if model.name not in self.OPERATIONS:
+            return self._response(400, {'Error': {'Code': 'ValidationException',
+                                                  'Message': '{} is not modelled'.format(model.name)}})
+        key, action, id_param = self.OPERATIONS[model.name]
+        request = json.loads(params['body'] or b'{}')
+        with self._lock:
+            store = self.resources[key]
+            if action == 'list':
+                return self._response(200, {key: list(store.values())})
+            if action == 'get':
+                if request[id_param] not in store:
+                    return self._response(404, {'Error': {'Code': 'ResourceNotFoundException',
+                                                          'Message': '{} not found'.format(request[id_param])}})
+                return self._response(200, copy.deepcopy(store[request[id_param]]))
+            response = {}
+            if action == 'put':
+                if id_param not in request:
+                    # the service numbers detector versions itself and returns the new number
+                    request[id_param] = str(max(map(int, store), default=0) + 1)
+                    response[id_param] = request[id_param]
+                store[request[id_param]] = dict(self.DEFAULTS.get(key, {}), **request)
+            else:
+                # delete_rule identifies its rule by a nested {detectorId, ruleId, ruleVersion} reference
+                store.pop(request.get('rule', request)[id_param], None)
+        return self._response(200, response)
@@ -12,18 +12,27 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+import asyncio
+import copy
 import json
 import logging
 import sys
+import threading
+import time
+from types import MappingProxyType
 
+import boto3
+import pandas as pd
 import pytest
+from botocore.exceptions import ClientError
 
 from frauddetector import frauddetector
+from frauddetector.frauddetector import RuleOpResult
 
 lh = logging.getLogger('test_frauddetector')
 
-MODEL_VERSION = "1"
-VARIABLES = [
+# frozen so the tests share them without one of them modifying the project definition for the rest
+VARIABLES = tuple(map(MappingProxyType, [
             {
                 "name": "test_email_address",
                 "variableType": "EMAIL_ADDRESS",
@@ -47,16 +56,79 @@ VARIABLES = [
                 "variableType": "CATEGORICAL",
                 "dataType": "STRING"
             }
-        ]
+        ]))
 
-LABELS = [
+LABELS = tuple(map(MappingProxyType, [
     {
         "name": "test_legit"
     },
     {
         "name": "test_fraud"
     }
-]
+]))
+
+VARIABLE_NAMES = tuple(v['name'] for v in VARIABLES)
+LABEL_NAMES = tuple(l['name'] for l in LABELS)
+EXPECTED_VARS = frozenset(VARIABLE_NAMES)
+
+def _replay_prediction(request):
+    """get_event_prediction response of the registration model. The scores echo the request's eventId, so tests
+    can check that each prediction lines up with its event"""
+    return {
+        'modelScores': [{'modelVersion': {'modelId': 'registration_model', 'modelType': 'ONLINE_FRAUD_INSIGHTS',
+                                          'modelVersionNumber': '1.0'},
+                         'scores': {'registration_model_insightscore': 42.0, 'eventId': request['eventId']}}],
+        'ruleResults': [{'ruleId': 'low_fraud_risk', 'outcomes': ['approve_outcome']}]
+    }
+
+
+# service responses of the pre-trained registration-project detector the rule and prediction tests run against,
+# replayed by the in-memory backend so these tests need no live model
+REGISTRATION_REPLAY = {
+    'GetEventPrediction': _replay_prediction
+}
+
+
+def _registration_detector(backend, boto_session):
+    detector = frauddetector.FraudDetector(
+        entity_type="registration",
+        event_type="user-registration",
+        detector_name="registration-project",
+        model_name="registration_model",
+        model_version="1.0",
+        model_type="ONLINE_FRAUD_INSIGHTS",
+        region='eu-west-1',
+        detector_version="1",
+        session=boto_session
+    )
+    backend.attach(detector.fd)
+    backend.canned.update(REGISTRATION_REPLAY)
+    return detector
+
+
+@pytest.fixture(scope="module")
+def registration_detector(backend, boto_session):
+    """The pre-trained registration-project detector of /example/frauddetector_sdk_example.ipynb,
+    shared by the rule and prediction tests and replayed by the in-memory backend"""
+    return _registration_detector(backend, boto_session)
+
+
+@pytest.fixture
+def detector(backend, boto_session):
+    """A fresh registration-project detector, for tests that depend on its per-instance caches"""
+    detector = _registration_detector(backend, boto_session)
+    yield detector
+    backend.detach(detector.fd)
+
+# JSON events of the registration detector, the timestamp key sits next to the event variables
+BATCH_EVENTS = (
+    MappingProxyType({"EVENT_TIMESTAMP": "2021-11-12T12:00:00Z",
+                      "email_address": "johndoe@exampledomain.com", "ip_address": "1.2.3.4"}),
+    MappingProxyType({"EVENT_TIMESTAMP": "2021-11-12T12:05:00Z",
+                      "email_address": "janedoe@exampledomain.com", "ip_address": "5.6.7.8"}),
+    MappingProxyType({"EVENT_TIMESTAMP": "2021-11-12T12:10:00Z",
+                      "email_address": "fred@exampledomain.com", "ip_address": "9.10.11.12"}),
+)
 
 DATA = [
     ("my.name@fake.com", "192.168.0.254", 45, "A", "test_fraud"),
@@ -68,244 +140,611 @@ DATA = [
 ]
 
 
-class TestFraudDetectorClass:
-
-    @classmethod
-    def setup_class(cls):
-        lh.debug("class setup: {}".format(cls.__name__))
-        cls.fd = frauddetector.FraudDetector(model_version=MODEL_VERSION,
-                                             entity_type="test_transaction",
-                                             event_type="test_credit_card_transaction",
-                                             model_name="test_credit_card_model",
-                                             detector_name="test_credit_card_fraud_project",
-                                             model_type="ONLINE_FRAUD_INSIGHTS",
-                                             region='eu-west-1',
-                                             detector_version="1"
-                                             )
-
-
-    @classmethod
-    def teardown_class(cls):
-        lh.debug("class teardown: {}".format(cls.__name__))
-        cls.fd.delete_model()
-        cls.fd.delete_event_type()
-        cls.fd.delete_entity_type()
-        response = cls.fd.delete_variables([v['name'] for v in VARIABLES])
-        response = cls.fd.delete_labels([l['name'] for l in LABELS])
-
-    #def setup_method(self, method):
-    #    lh.info("method setup: {}".format(method.__name__))
-
-    #def teardown_method(self, method):
-    #    lh.info("method teardown: {}".format(method.__name__))
-
-    def test_aws_connect(self):
-        response = self.fd.iam.list_account_aliases()
-        assert response['ResponseMetadata']['HTTPStatusCode'] == 200
-
-    # test project with variables, labels, model and event type is created when FraudDetector instance is instantiated
-    def test_fraud_project(self):
-        # add variables
-        self.fd.create_variables(VARIABLES)
-
-        # test that variables have been created in the AWS Fraud Detector environment
-        variable_names = [v['name'] for v in self.fd.all_variables['variables']]
-        # confirm variables exist as subset of all variables that exist (others may exist outside the test framework)
-        assert (set(variable_names)).issuperset(
-            {"test_ip_address", "test_email_address", "test_quantity", "test_widget_class"})
-
-
-        #status = self.fd.delete_model()
-        #print(status)
-        #print(self.fd.event_type_details)
-        #self.fd.delete_event_type()
-
-        # remove variables
-        variables_list = [v['name'] for v in VARIABLES]
-        response = self.fd.delete_variables(variables_list)
-
-        # test that the FraudDetector instance has had variables attribute updated
-        variable_names = [v['name'] for v in self.fd.all_variables['variables']]
-        # confirm test variables no longer exist as subset of all variables that exist
-        for v in variable_names:
-            assert v not in set({"test_ip_address", "test_email_address", "test_quantity", "test_widget_class"})
-
-        # test creating the full "project" for training - event-type with labels and variables, entity type and model
-        self.fd._setup_project(variables=VARIABLES, labels=LABELS)
-
-    def test_fraud_outcomes(self):
-        test_outcomes = [("test_outcome1", "this is test outcome 1"), ("test_outcome2", "this is test outcome 2")]
-
-        self.fd.create_outcomes(test_outcomes)
-        outcomes = self.fd.outcomes
-        assert (set(outcomes)).issuperset(
-            test_outcomes)
-
-        # clean-up test outcomes
-        outcome_names = [x[0] for x in test_outcomes]
-        self.fd.delete_outcomes(outcome_names)
-        outcomes = self.fd.outcomes
-        assert (set(test_outcomes)) not in set(outcomes)
-
-    @pytest.mark.skip(reason="can only run this if the AWS environment and pre-created model is available")
-    def test_rules(self):
-        """
-        Test creating rules and outcomes for a pre-existing ACTIVE model called
-            registration_model (Version 1.0)
+@pytest.mark.skip(reason="can only run this if the AWS environment is available, offline it only reaches the mock")
+def test_aws_connect(aws_reachable):
+    assert aws_reachable
+
+
+def test_default_clients_share_one_session(aws, monkeypatch):
+    sessions = []
+    session_class = frauddetector.boto3.session.Session
+
+    def _session(**kwargs):
+        sessions.append(kwargs)
+        return session_class(**kwargs)
+
+    monkeypatch.setattr(frauddetector.boto3.session, 'Session', _session)
+    frauddetector._get_session.cache_clear()
+    frauddetector._get_client.cache_clear()
+    detectors = [frauddetector.FraudDetector(entity_type="registration", event_type="user-registration",
+                                             detector_name="registration-project", model_name="registration_model",
+                                             model_version="1.0", model_type="ONLINE_FRAUD_INSIGHTS",
+                                             region='eu-west-1', pool_size=pool_size)
+                 for pool_size in (64, 64, 128)]
+    # the frauddetector, s3 and iam clients of every instance come from one session for the region
+    assert sessions == [{'region_name': 'eu-west-1'}]
+    assert detectors[0].fd is detectors[1].fd
+    assert detectors[0].fd is not detectors[2].fd
+
+
+def test_paginate_follows_next_token(detector, backend, monkeypatch):
+    pages = {None: {'variables': [{'name': 'page1_variable'}], 'nextToken': 'page2'},
+             'page2': {'variables': [{'name': 'page2_variable'}]}}
+    monkeypatch.setitem(backend.canned, 'GetVariables', lambda request: copy.deepcopy(pages[request.get('nextToken')]))
+    assert [v['name'] for v in detector.all_variables['variables']] == ['page1_variable', 'page2_variable']
+
+
+def test_cached_call_ttl(detector, backend, monkeypatch):
+    calls = []
+    monkeypatch.setitem(backend.canned, 'GetOutcomes', lambda request: calls.append(request) or {'outcomes': []})
+
+    detector.outcomes
+    detector.outcomes
+    # the second call within the ttl is served from the cached listing
+    assert len(calls) == 1
+
+    # age the cached listing past the 30s ttl - the next call fetches it again
+    fetched, response = detector._cache['get_outcomes']
+    detector._cache['get_outcomes'] = (fetched - 31, response)
+    detector.outcomes
+    assert len(calls) == 2
+
+
+# test project with variables, labels, model and event type is created when FraudDetector instance is instantiated
+def test_fraud_project(fd):
+    # add variables
+    fd.create_variables(VARIABLES)
+
+    # test that variables have been created in the AWS Fraud Detector environment
+    variable_names = {v['name'] for v in fd.all_variables['variables']}
+    # confirm variables exist as subset of all variables that exist (others may exist outside the test framework)
+    assert EXPECTED_VARS.issubset(variable_names)
+
+
+    #status = fd.delete_model()
+    #print(status)
+    #print(fd.event_type_details)
+    #fd.delete_event_type()
+
+    # remove variables
+    response = fd.delete_variables(VARIABLE_NAMES)
+
+    # test that the FraudDetector instance has had variables attribute updated
+    variable_names = {v['name'] for v in fd.all_variables['variables']}
+    # confirm test variables no longer exist as subset of all variables that exist
+    assert not (variable_names & EXPECTED_VARS)
+
+    # test creating the full "project" for training - event-type with labels and variables, entity type and model
+    fd._setup_project(variables=VARIABLES, labels=LABELS)
+    event_type = fd.get_event_type()[0]
+    assert set(event_type['eventVariables']) == EXPECTED_VARS
+    assert set(event_type['labels']) == set(LABEL_NAMES)
+
+
+def test_fraud_outcomes(fd):
+    test_outcomes = [("test_outcome1", "this is test outcome 1"), ("test_outcome2", "this is test outcome 2")]
+
+    fd.create_outcomes(test_outcomes)
+    outcomes = fd.outcomes
+    assert (set(outcomes)).issuperset(
+        test_outcomes)
+
+    # clean-up test outcomes
+    outcome_names = [x[0] for x in test_outcomes]
+    fd.delete_outcomes(outcome_names)
+    outcomes = fd.outcomes
+    assert (set(test_outcomes)) not in set(outcomes)
+
+
+def test_create_outcomes_skips_identical(detector, backend, monkeypatch):
+    monkeypatch.setitem(backend.resources, 'outcomes',
+                        {'approve_outcome': {'name': 'approve_outcome', 'description': 'approve'}})
+    puts = []
+    monkeypatch.setitem(backend.canned, 'PutOutcome', lambda request: puts.append(request) or {})
+
+    # an identical outcome is not put again
+    assert detector.create_outcomes([("approve_outcome", "approve")]) == {"approve_outcome": "skipped"}
+    assert puts == []
+
+    # ... but a changed description is, put_outcome updates it
+    detector.create_outcomes([("approve_outcome", "approve the event")])
+    assert puts == [{'name': 'approve_outcome', 'description': 'approve the event'}]
+
+
+def test_rules(registration_detector):
+    """
+    Test creating rules and outcomes for a pre-existing ACTIVE model called
+        registration_model (Version 1.0)
+    that is associated with Detector
+        registration-project (Version 1)
+
+    Against live AWS this depends on pre-creating the detector and model in /example/frauddetector_sdk_example.ipynb,
+    offline the backend replays the detector's responses
+    """
+
+    test_outcomes = [("test_outcome1_b", "this is test outcome 1"), ("test_outcome2_b", "this is test outcome 2")]
+
+    test_rules = [{'ruleId': 'test_rule1',
+                   'expression': '$registration_model_insightscore > 900',
+                   'outcomes': ["test_outcome1_b"]
+                  },
+                  {'ruleId': 'test_rule2',
+                   'expression': '$registration_model_insightscore <= 900',
+                   'outcomes': ["test_outcome1_b", "test_outcome2_b"]
+                  }
+                 ]
+
+    # create outcomes to map the rules to
+    registration_detector.create_outcomes(test_outcomes)
+
+    registration_detector.create_rules(test_rules)
+
+    rules = registration_detector.rules
+    rule_ids = [r['ruleId'] for r in rules]
+    assert "test_rule1" in rule_ids
+
+    # clean up rules
+    live_test_rules = [r for r in rules if r['ruleId'] in ['test_rule1', 'test_rule2']]
+    registration_detector.delete_rules(live_test_rules)
+
+    # clean-up test outcomes
+    outcome_names = [x[0] for x in test_outcomes]
+    registration_detector.delete_outcomes(outcome_names)
+
+    assert "test_rule1" not in [r['ruleId'] for r in registration_detector.rules]
+
+
+def test_refresh_drops_cached_rules(detector, backend):
+    assert 'test_rule_external' not in {r['ruleId'] for r in detector.rules}
+    # a rule created outside this instance shows up once the cached rules are dropped
+    backend.resources['ruleDetails']['test_rule_external'] = {'ruleId': 'test_rule_external', 'ruleVersion': '1',
+                                                              'detectorId': detector.detector_name}
+    detector.refresh()
+    assert 'test_rule_external' in {r['ruleId'] for r in detector.rules}
+    assert {'detectorId': detector.detector_name, 'ruleId': 'test_rule_external',
+            'ruleVersion': '1'} in detector._get_rule_refs()
+    del backend.resources['ruleDetails']['test_rule_external']
+
+
+def test_rule_op_results(detector, backend, monkeypatch):
+    rule = {'ruleId': 'status_rule',
+            'expression': '$registration_model_insightscore > 900',
+            'outcomes': ["approve_outcome"]}
+
+    results = detector.create_rules([rule, {'ruleId': 'status_rule_invalid'}])
+    assert [(r.rule_id, r.status) for r in results] == [('status_rule', RuleOpResult.CREATED),
+                                                        ('status_rule_invalid', RuleOpResult.SKIPPED_INVALID)]
+    # the rule is in place now, so a second run leaves it alone
+    assert [r.status for r in detector.create_rules([rule])] == [RuleOpResult.SKIPPED_EXISTS]
+
+    monkeypatch.setitem(backend.errors, 'CreateRule', 'ValidationException')
+    results = detector.create_rules([dict(rule, ruleId='status_rule_failed')])
+    assert [(r.rule_id, r.status) for r in results] == [('status_rule_failed', RuleOpResult.FAILED)]
+    assert isinstance(results[0].payload, ClientError)
+
+    live_rules = [r for r in detector.rules if r['ruleId'] == 'status_rule']
+    monkeypatch.setitem(backend.errors, 'DeleteRule', 'ValidationException')
+    assert [r.status for r in detector.delete_rules(live_rules)] == [RuleOpResult.FAILED]
+    monkeypatch.delitem(backend.errors, 'DeleteRule')
+    assert [r.status for r in detector.delete_rules(live_rules)] == [RuleOpResult.DELETED]
+    assert 'status_rule' not in {r['ruleId'] for r in detector.rules}
+
+
+def test_create_rules_retries_throttled_chunk(detector, backend, monkeypatch):
+    rules = [{'ruleId': 'throttled_rule_{}'.format(i),
+              'expression': '$registration_model_insightscore > 900',
+              'outcomes': ["approve_outcome"]} for i in range(2)]
+    # the first chunk is throttled until the backoff - the service has recovered by the time it is sent again
+    monkeypatch.setitem(backend.errors, 'CreateRule', 'ThrottlingException')
+    sleeps = []
+    monkeypatch.setattr(frauddetector.time, 'sleep', lambda secs: sleeps.append(secs) or backend.errors.clear())
+
+    results = detector.create_rules(rules, chunk_size=1)
+    assert [r.status for r in results] == [RuleOpResult.CREATED, RuleOpResult.CREATED]
+    assert len(sleeps) == 1 and 0.8 <= sleeps[0] <= 1.2
+    assert {r['ruleId'] for r in rules} <= set(backend.resources['ruleDetails'])
+    for rule in rules:
+        del backend.resources['ruleDetails'][rule['ruleId']]
+
+
+@pytest.mark.parametrize("rule", [
+    "test_rule_not_a_dict",
+    {'ruleId': 'test_rule_no_expression', 'outcomes': ["approve_outcome"]},
+    {'ruleId': 'test_rule_no_outcomes', 'expression': '$registration_model_insightscore > 900'},
+    {'ruleId': 'test_rule_empty_outcomes', 'expression': '$registration_model_insightscore > 900', 'outcomes': []},
+    {'ruleId': ' ', 'expression': '$registration_model_insightscore > 900', 'outcomes': ["approve_outcome"]},
+])
+def test_create_rules_skips_invalid(registration_detector, backend, monkeypatch, rule):
+    # invalid rules are rejected before any call - one that got through would come back FAILED
+    monkeypatch.setitem(backend.errors, 'CreateRule', 'ValidationException')
+    results = registration_detector.create_rules([rule])
+    assert [r.status for r in results] == [RuleOpResult.SKIPPED_INVALID]
+
+
+def test_create_rules_skips_duplicates(registration_detector):
+    rule = {'ruleId': 'test_rule_dup',
+            'expression': '$registration_model_insightscore > 900',
+            'outcomes': ["approve_outcome"]}
+    results = registration_detector.create_rules([rule, dict(rule, expression='$registration_model_insightscore > 0')])
+    assert [r.status for r in results] == [RuleOpResult.CREATED, RuleOpResult.SKIPPED_DUPLICATE]
+    # only the first occurrence was sent
+    live_rules = [r for r in registration_detector.rules if r['ruleId'] == 'test_rule_dup']
+    assert [r['expression'] for r in live_rules] == [rule['expression']]
+    registration_detector.delete_rules(live_rules)
+
+
+def test_delete_rules_skips_rules_in_use(detector, backend, monkeypatch):
+    rules = [{'ruleId': 'test_rule_in_use', 'ruleVersion': '1'}, {'ruleId': 'test_rule_unused', 'ruleVersion': '1'}]
+    # an ACTIVE detector-version deploys the first rule
+    monkeypatch.setitem(backend.canned, 'DescribeDetector',
+                        {'detectorVersionSummaries': [{'detectorVersionId': '1', 'status': 'ACTIVE'}]})
+    monkeypatch.setitem(backend.canned, 'GetDetectorVersion', {'detectorVersionId': '1', 'rules': rules[:1]})
+    results = detector.delete_rules(rules)
+    assert [(r.rule_id, r.status) for r in results] == [('test_rule_in_use', RuleOpResult.SKIPPED_IN_USE),
+                                                        ('test_rule_unused', RuleOpResult.DELETED)]
+
+
+def test_delete_rules_all_invalid(detector, backend, monkeypatch):
+    # nothing valid to delete, so the detector versions are not even looked up
+    monkeypatch.setitem(backend.errors, 'DescribeDetector', 'ValidationException')
+    results = detector.delete_rules([{'ruleId': 'test_rule_no_version'}, "test_rule_not_a_dict"])
+    assert [(r.rule_id, r.status) for r in results] == [('test_rule_no_version', RuleOpResult.SKIPPED_INVALID),
+                                                        (None, RuleOpResult.SKIPPED_INVALID)]
+
+
+def test_predict(registration_detector):
+    """Test predictions for a pre-existing ACTIVE model called
+                registration_model (Version 1.0)
         that is associated with Detector
-            registration-project (Version 1)
-
-        Test dependency on pre-creating the detector and model in /example/frauddetector_sdk_example.ipynb
-        """
-
-        test_outcomes = [("test_outcome1_b", "this is test outcome 1"), ("test_outcome2_b", "this is test outcome 2")]
-
-        test_rules = [{'ruleId': 'test_rule1',
-                       'expression': '$registration_model_insightscore > 900',
-                       'outcomes': ["test_outcome1_b"]
-                      },
-                      {'ruleId': 'test_rule2',
-                       'expression': '$registration_model_insightscore <= 900',
-                       'outcomes': ["test_outcome1_b", "test_outcome2_b"]
-                      }
-                     ]
-
-        detector = frauddetector.FraudDetector(
-            entity_type="transaction",
-            event_type="registrations",
-            detector_name="registration-project",
-            model_name="registration_model",
-            model_version="1.0",
-            model_type="ONLINE_FRAUD_INSIGHTS",
-            region='eu-west-1',
-            detector_version="1"
-        )
-
-        # create outcomes to map the rules to
-        detector.create_outcomes(test_outcomes)
-
-        detector.create_rules(test_rules)
-
-        rules = detector.rules
-        rule_ids = [r['ruleId'] for r in rules]
-        assert "test_rule1" in rule_ids
-
-        # clean up rules
-        live_test_rules = [r for r in rules if r['ruleId'] in ['test_rule1', 'test_rule2']]
-        detector.delete_rules(live_test_rules)
-
-        # clean-up test outcomes
-        outcome_names = [x[0] for x in test_outcomes]
-        detector.delete_outcomes(outcome_names)
-
-        assert "test_rule1" not in [r['ruleId'] for r in detector.rules]
-
-    @pytest.mark.skip(reason="can only run this if the AWS environment and pre-created model is available")
-    def test_predict(self):
-        """Test predictions for a pre-existing ACTIVE model called
-                    registration_model (Version 1.0)
-            that is associated with Detector
-                    registration-project (Version 1)
-            Rules and outcomes should be in place in preparation as well:
-                    rules: high_fraud_risk, low_fraud_risk, no_fraud_risk
-                    outcomes: approve_outcome, review_outcome, verify_outcome
-
-            Test has dependency on pre-creating the detector and model using /example/frauddetector_sdk_example.ipynb
-        """
-
-        detector = frauddetector.FraudDetector(
-            entity_type="registration",
-            event_type="user-registration",
-            detector_name="registration-project",
-            model_name="registration_model",
-            model_version="1.0",
-            model_type="ONLINE_FRAUD_INSIGHTS",
-            region='eu-west-1',
-            detector_version="1"
-        )
-
-        event_variables = {
-            'email_address': 'johndoe@exampledomain.com',
-            'ip_address': '1.2.3.4'
-        }
-
-        #print(detector.predict('2021-11-13T12:18:21Z', event_variables)['ruleResults'])
-        first_rule_result = detector.predict('2021-11-12T12:00:00Z', event_variables)['ruleResults'][0]['outcomes']
-        # check list of outcomes is length gt 0
-        assert len(first_rule_result) > 0
-
-
-    @pytest.mark.skip(reason="can only run this if the AWS environment and pre-created model is available")
-    def test_create_new_detector_version(self):
-        """Test predictions for a pre-existing ACTIVE model called
-                    registration_model (Version 1.0)
-            that is associated with Detector
-                    registration-project (Version 1)
-            Rules and outcomes should be in place in preparation as well:
-                    rules: high_fraud_risk, low_fraud_risk, no_fraud_risk
-                    outcomes: approve_outcome, review_outcome, verify_outcome
-
-            Test has dependency on pre-creating the detector and model using /example/frauddetector_sdk_example.ipynb
-        """
-
-        detector = frauddetector.FraudDetector(
-            entity_type="registration",
-            event_type="user-registration",
-            detector_name="registration-project",
-            model_name="registration_model",
-            model_version="1.0",
-            model_type="ONLINE_FRAUD_INSIGHTS",
-            region='eu-west-1',
-            detector_version="1"
-        )
-        detector_version_rules = [{
-            'ruleId': 'high_fraud_risk',
+                registration-project (Version 1)
+        Rules and outcomes should be in place in preparation as well:
+                rules: high_fraud_risk, low_fraud_risk, no_fraud_risk
+                outcomes: approve_outcome, review_outcome, verify_outcome
+
+        Against live AWS this depends on pre-creating the detector and model using
+        /example/frauddetector_sdk_example.ipynb, offline the backend replays the model's predictions
+    """
+
+    event_variables = {
+        'email_address': 'johndoe@exampledomain.com',
+        'ip_address': '1.2.3.4'
+    }
+
+    #print(registration_detector.predict('2021-11-13T12:18:21Z', event_variables)['ruleResults'])
+    first_rule_result = registration_detector.predict('2021-11-12T12:00:00Z', event_variables)['ruleResults'][0]['outcomes']
+    # check list of outcomes is length gt 0
+    assert len(first_rule_result) > 0
+
+
+def test_batch_predict(registration_detector, monkeypatch):
+    """Test batch predictions for a pre-existing ACTIVE model called
+                registration_model (Version 1.0)
+        that is associated with Detector
+                registration-project (Version 1)
+
+        Against live AWS this depends on pre-creating the detector and model using
+        /example/frauddetector_sdk_example.ipynb, offline the backend replays the model's predictions
+    """
+
+    events = pd.DataFrame(
+        data=[
+            ["2021-11-12T12:00:00Z", "johndoe@exampledomain.com", "1.2.3.4"],
+            ["2021-11-12T12:05:00Z", "janedoe@exampledomain.com", "5.6.7.8"],
+            ["2021-11-12T12:10:00Z", "fred@exampledomain.com", "9.10.11.12"]],
+        columns=["EVENT_TIMESTAMP", "email_address", "ip_address"])
+
+    # pin the event ids - the replayed predictions echo them back
+    event_ids = ["test-event-{}".format(i) for i in range(events.shape[0])]
+    monkeypatch.setattr(registration_detector, '_event_ids', lambda n: event_ids[:n])
+    predictions = registration_detector.batch_predict(timestamp="EVENT_TIMESTAMP", events=events, max_workers=2)
+    # one prediction per row, returned in input order
+    assert [p['eventId'] for p in predictions] == event_ids
+    assert all(len(p['ruleResults']) > 0 for p in predictions)
+
+
+def test_batch_predict_max_in_flight(registration_detector, backend, monkeypatch):
+    lock = threading.Lock()
+    calls = {'current': 0, 'peak': 0}
+
+    def _slow_prediction(request):
+        with lock:
+            calls['current'] += 1
+            calls['peak'] = max(calls['peak'], calls['current'])
+        time.sleep(0.01)
+        with lock:
+            calls['current'] -= 1
+        return _replay_prediction(request)
+
+    monkeypatch.setitem(backend.canned, 'GetEventPrediction', _slow_prediction)
+    events = [dict(e) for e in BATCH_EVENTS] * 4
+    predictions = registration_detector.batch_predict(timestamp="EVENT_TIMESTAMP", events=events,
+                                                      max_workers=8, max_in_flight=2)
+    assert len(predictions) == len(events)
+    # more workers than the cap - only max_in_flight requests are ever outstanding
+    assert 1 < calls['peak'] <= 2
+
+
+def test_batch_predict_dispatch(registration_detector, monkeypatch):
+    # record which inputs go through the DataFrame conversion
+    frames = []
+    dataframe_events = registration_detector._dataframe_events
+
+    def _spy(timestamp, frame):
+        frames.append(frame)
+        return dataframe_events(timestamp, frame)
+
+    monkeypatch.setattr(registration_detector, '_dataframe_events', _spy)
+    events = [dict(e) for e in BATCH_EVENTS]
+
+    # JSON events: a list is one prediction per event, a single dict one prediction, neither is a DataFrame
+    assert len(registration_detector.batch_predict(timestamp="EVENT_TIMESTAMP", events=events)) == len(events)
+    assert len(registration_detector.batch_predict(timestamp="EVENT_TIMESTAMP", events=events[0])) == 1
+    assert frames == []
+    with pytest.raises(KeyError, match="positions \\[1\\]"):
+        registration_detector.batch_predict(timestamp="EVENT_TIMESTAMP",
+                                            events=[events[0], {"email_address": "no@timestamp.com"}])
+
+    # a DataFrame goes through the conversion, handed in through events or df
+    frame = pd.DataFrame(events)
+    assert len(registration_detector.batch_predict(timestamp="EVENT_TIMESTAMP", events=frame)) == len(events)
+    assert len(registration_detector.batch_predict(timestamp="EVENT_TIMESTAMP", df=frame)) == len(events)
+    assert len(frames) == 2 and all(f is frame for f in frames)
+
+
+def test_batch_predict_job(detector, backend, boto_session, monkeypatch):
+    boto_session.client('s3').create_bucket(Bucket="test-batch-predictions",
+                                            CreateBucketConfiguration={'LocationConstraint': 'eu-west-1'})
+    job = {'jobId': 'test-job', 'status': 'COMPLETE', 'inputPath': 's3://test-batch-predictions/input/events.csv',
+           'outputPath': 's3://test-batch-predictions/output'}
+    monkeypatch.setitem(backend.canned, 'CreateBatchPredictionJob', {})
+    monkeypatch.setitem(backend.canned, 'GetBatchPredictionJobs', {'batchPredictions': [job]})
+
+    events = pd.DataFrame([dict(e) for e in BATCH_EVENTS])
+    response = detector.batch_predict_job(job['inputPath'], job['outputPath'],
+                                          role_arn="arn:aws:iam::123456789012:role/test",
+                                          df=events, timestamp="EVENT_TIMESTAMP", job_id=job['jobId'])
+    assert response == job
+
+    # the frame was uploaded with the columns the batch prediction job reads
+    body = detector.s3.get_object(Bucket="test-batch-predictions", Key="input/events.csv")['Body']
+    uploaded = pd.read_csv(body)
+    assert list(uploaded.columns) == ['EVENT_ID', 'EVENT_TIMESTAMP', 'ENTITY_ID', 'ENTITY_TYPE',
+                                      'email_address', 'ip_address']
+    assert uploaded['EVENT_TIMESTAMP'].tolist() == events['EVENT_TIMESTAMP'].tolist()
+    assert set(uploaded['ENTITY_TYPE']) == {"registration"}
+    assert uploaded['EVENT_ID'].is_unique
+
+
+@pytest.mark.parametrize("input_s3_uri, output_s3_uri, timestamp", [
+    ("s3://test-batch-predictions/input/events.csv", "s3://test-batch-predictions/output", None),
+    ("s3://test-batch-predictions/input/events.csv", "s3://test-batch-predictions/output", "not_a_column"),
+    ("test-batch-predictions/input/events.csv", "s3://test-batch-predictions/output", "EVENT_TIMESTAMP"),
+    ("s3://test-batch-predictions/input/events.csv", "https://test-batch-predictions/output", "EVENT_TIMESTAMP"),
+    ("s3://test-batch-predictions", "s3://test-batch-predictions/output", "EVENT_TIMESTAMP"),
+])
+def test_batch_predict_job_rejects_bad_arguments(detector, input_s3_uri, output_s3_uri, timestamp):
+    events = pd.DataFrame([dict(e) for e in BATCH_EVENTS])
+    with pytest.raises(ValueError):
+        detector.batch_predict_job(input_s3_uri, output_s3_uri, role_arn="arn:aws:iam::123456789012:role/test",
+                                   df=events, timestamp=timestamp)
+
+
+def test_abatch_predict(registration_detector, backend, monkeypatch):
+    aioboto3 = pytest.importorskip("aioboto3")
+    # the async client is built from the detector's boto3 session, so it resolves the same region
+    assert registration_detector._async_session().region_name == 'eu-west-1'
+
+    # the aioboto3 client is not one of the detector's clients - route it to the backend through its session
+    session = aioboto3.Session(aws_access_key_id="testing", aws_secret_access_key="testing", region_name='eu-west-1')
+    session.events.register('before-call.frauddetector', backend._handle)
+    monkeypatch.setattr(registration_detector, '_async_session', lambda: session)
+
+    events = [dict(e) for e in BATCH_EVENTS]
+    predictions = asyncio.run(registration_detector.abatch_predict("EVENT_TIMESTAMP", events))
+    assert len(predictions) == len(events)
+    assert all(len(p['ruleResults']) > 0 for p in predictions)
+
+    frame = pd.DataFrame(events)
+    predictions = asyncio.run(registration_detector.abatch_predict("EVENT_TIMESTAMP", df=frame))
+    assert len(predictions) == frame.shape[0]
+
+    with pytest.raises(ValueError):
+        asyncio.run(registration_detector.abatch_predict("EVENT_TIMESTAMP"))
+
+
+def test_abatch_predict_session_credentials(registration_detector, boto_session):
+    pytest.importorskip("aioboto3")
+    # credentials from the environment/profile chain are resolved again by aiobotocore, not copied as a snapshot
+    session = registration_detector._async_session()
+    credentials = asyncio.run(session.get_credentials())
+    assert credentials.access_key == boto_session.get_credentials().access_key
+    assert session.region_name == 'eu-west-1'
+
+    # static keys handed to the boto3 session are carried over as they are
+    static = boto3.session.Session(aws_access_key_id="static_key", aws_secret_access_key="static_secret",
+                                   region_name='eu-central-1')
+    detector = frauddetector.FraudDetector(entity_type="registration", event_type="user-registration",
+                                           detector_name="registration-project", model_name="registration_model",
+                                           model_version="1.0", model_type="ONLINE_FRAUD_INSIGHTS",
+                                           region='eu-central-1', session=static)
+    session = detector._async_session()
+    credentials = asyncio.run(session.get_credentials())
+    assert (credentials.access_key, credentials.secret_key) == ("static_key", "static_secret")
+    assert session.region_name == 'eu-central-1'
+
+
+def test_deploy_after_delete_detector_version(detector, backend, monkeypatch):
+    monkeypatch.setitem(backend.canned, 'GetModelVersion', {'status': 'ACTIVE'})
+    versions = backend.resources['detectorVersionSummaries']
+
+    assert detector.deploy()['detectorVersionId'] == "1"
+    assert detector.deploy() == {'status': 'unchanged', 'detectorVersionId': "1"}
+
+    # a deleted detector-version must be deployed again, not reported unchanged
+    detector.delete_detector_version()
+    assert "status" not in detector.deploy()
+    assert list(versions) == ["1"]
+
+    # ... also when it was deleted outside this instance
+    versions.clear()
+    assert "status" not in detector.deploy()
+    assert list(versions) == ["1"]
+    detector.delete_detector_version()
+
+
+def test_deploy_after_create_new_detector_version(detector, backend, monkeypatch):
+    monkeypatch.setitem(backend.canned, 'GetModelVersion', {'status': 'ACTIVE'})
+    versions = backend.resources['detectorVersionSummaries']
+
+    assert detector.deploy()['detectorVersionId'] == "1"
+    # a newer detector-version with other rules is the latest one now - deploying must not report "1" unchanged
+    detector.create_new_detector_version([{'ruleId': 'high_fraud_risk', 'ruleVersion': '1'}])
+    assert "status" not in detector.deploy()
+    assert list(versions) == ["1", "2", "3"]
+    versions.clear()
+
+
+@pytest.mark.parametrize("status, error", [
+    ({'status': 'TRAINING_FAILED'}, None),
+    (None, 'ResourceNotFoundException'),
+])
+def test_deploy_wait_for_model_fails_fast(detector, backend, monkeypatch, status, error):
+    if status is not None:
+        monkeypatch.setitem(backend.canned, 'GetModelVersion', status)
+    if error is not None:
+        monkeypatch.setitem(backend.errors, 'GetModelVersion', error)
+    sleeps = []
+    monkeypatch.setattr(frauddetector.time, 'sleep', sleeps.append)
+    # a failed or missing model-version never becomes ACTIVE - raise instead of polling until the timeout
+    with pytest.raises(EnvironmentError, match="cannot become active"):
+        detector.deploy(wait_for_model=True)
+    assert sleeps == []
+
+
+def test_model_status_sees_external_changes(detector, backend, monkeypatch):
+    monkeypatch.setitem(backend.canned, 'GetModelVersion', {'status': 'ACTIVE'})
+    assert detector.model_status == 'ACTIVE'
+    # deactivated outside this instance
+    backend.canned['GetModelVersion'] = {'status': 'INACTIVE'}
+    assert detector.model_status == 'INACTIVE'
+
+    # a failed training is remembered until refresh()
+    backend.canned['GetModelVersion'] = {'status': 'TRAINING_FAILED'}
+    assert detector.model_status == 'TRAINING_FAILED'
+    backend.canned['GetModelVersion'] = {'status': 'TRAINING_IN_PROGRESS'}
+    assert detector.model_status == 'TRAINING_FAILED'
+    detector.refresh()
+    assert detector.model_status == 'TRAINING_IN_PROGRESS'
+
+
+def test_deploy_wait_for_model_backoff_is_capped(detector, monkeypatch):
+    monkeypatch.setattr(type(detector), 'model_status', 'TRAINING_IN_PROGRESS')
+    sleeps = []
+    monkeypatch.setattr(frauddetector.time, 'sleep', sleeps.append)
+    clock = iter(range(10 ** 6))
+    monkeypatch.setattr(frauddetector.time, 'monotonic', lambda: next(clock))
+    with pytest.raises(TimeoutError):
+        detector.deploy(wait_for_model=True, timeout=5000)
+    assert len(sleeps) > 2000 and max(sleeps) == 60
+
+
+def test_create_new_detector_version_leaves_input_unchanged(detector):
+    detector_version_rules = [{'ruleId': 'high_fraud_risk', 'ruleVersion': '1'},
+                              {'ruleId': 'low_fraud_risk', 'ruleVersion': '1'}]
+    expected = copy.deepcopy(detector_version_rules)
+
+    response = detector.create_new_detector_version(detector_version_rules)
+    assert detector_version_rules == expected
+    # the service still got the detectorId on every rule
+    version = detector.fd.get_detector_version(detectorId=detector.detector_name,
+                                               detectorVersionId=response['detectorVersionId'])
+    assert all(r['detectorId'] == detector.detector_name for r in version['rules'])
+    detector.fd.delete_detector_version(detectorId=detector.detector_name,
+                                        detectorVersionId=response['detectorVersionId'])
+
+
+def test_batch_predict_leaves_input_unchanged(registration_detector):
+    events = [dict(e) for e in BATCH_EVENTS]
+    frame = pd.DataFrame(events)
+    expected = frame.copy()
+
+    registration_detector.batch_predict(timestamp="EVENT_TIMESTAMP", events=events)
+    registration_detector.batch_predict(timestamp="EVENT_TIMESTAMP", df=frame)
+    assert events == [dict(e) for e in BATCH_EVENTS]
+    pd.testing.assert_frame_equal(frame, expected)
+
+
+@pytest.mark.skip(reason="can only run this if the AWS environment and pre-created model is available")
+def test_create_new_detector_version():
+    """Test predictions for a pre-existing ACTIVE model called
+                registration_model (Version 1.0)
+        that is associated with Detector
+                registration-project (Version 1)
+        Rules and outcomes should be in place in preparation as well:
+                rules: high_fraud_risk, low_fraud_risk, no_fraud_risk
+                outcomes: approve_outcome, review_outcome, verify_outcome
+
+        Test has dependency on pre-creating the detector and model using /example/frauddetector_sdk_example.ipynb
+    """
+
+    detector = frauddetector.FraudDetector(
+        entity_type="registration",
+        event_type="user-registration",
+        detector_name="registration-project",
+        model_name="registration_model",
+        model_version="1.0",
+        model_type="ONLINE_FRAUD_INSIGHTS",
+        region='eu-west-1',
+        detector_version="1"
+    )
+    detector_version_rules = [{
+        'ruleId': 'high_fraud_risk',
+        'ruleVersion': '1'
+        },
+        {
+            'ruleId': 'low_fraud_risk',
             'ruleVersion': '1'
-            },
-            {
-                'ruleId': 'low_fraud_risk',
-                'ruleVersion': '1'
-            },
-            {
-                'ruleId': 'no_fraud_risk',
-                'ruleVersion': '1'
-            }]
-
-        response = detector.create_new_detector_version(detector_version_rules)
-
-        assert response['ResponseMetadata']['HTTPStatusCode'] == 200
-
-
-    @pytest.mark.skip(reason="can only run this if the AWS environment and pre-created model is available")
-    def test_create_new_rule_version(self):
-        """Test predictions for a pre-existing ACTIVE model called
-                    registration_model (Version 1.0)
-            that is associated with Detector
-                    registration-project (Version 1)
-            Rules and outcomes should be in place in preparation as well:
-                    rules: high_fraud_risk, low_fraud_risk, no_fraud_risk
-                    outcomes: approve_outcome, review_outcome, verify_outcome
-
-            Test has dependency on pre-creating the detector and model using /example/frauddetector_sdk_example.ipynb
-        """
-
-        detector = frauddetector.FraudDetector(
-            entity_type="registration",
-            event_type="user-registration",
-            detector_name="registration-project",
-            model_name="registration_model",
-            model_version="1.0",
-            model_type="ONLINE_FRAUD_INSIGHTS",
-            region='eu-west-1',
-            detector_version="1"
-        )
-
-        rule_object = {
-            'ruleId': 'high_fraud_risk',
-            'expression': '$registration_model_insightscore > 900',
-            'outcomes': ['verify_outcome'],
-            'ruleVersion': '2' #Need specification of correct version according to your latest rule version
-        }
+        },
+        {
+            'ruleId': 'no_fraud_risk',
+            'ruleVersion': '1'
+        }]
+
+    response = detector.create_new_detector_version(detector_version_rules)
+
+    assert response['ResponseMetadata']['HTTPStatusCode'] == 200
+
+
+@pytest.mark.skip(reason="can only run this if the AWS environment and pre-created model is available")
+def test_create_new_rule_version():
+    """Test predictions for a pre-existing ACTIVE model called
+                registration_model (Version 1.0)
+        that is associated with Detector
+                registration-project (Version 1)
+        Rules and outcomes should be in place in preparation as well:
+                rules: high_fraud_risk, low_fraud_risk, no_fraud_risk
+                outcomes: approve_outcome, review_outcome, verify_outcome
+
+        Test has dependency on pre-creating the detector and model using /example/frauddetector_sdk_example.ipynb
+    """
+
+    detector = frauddetector.FraudDetector(
+        entity_type="registration",
+        event_type="user-registration",
+        detector_name="registration-project",
+        model_name="registration_model",
+        model_version="1.0",
+        model_type="ONLINE_FRAUD_INSIGHTS",
+        region='eu-west-1',
+        detector_version="1"
+    )
+
+    rule_object = {
+        'ruleId': 'high_fraud_risk',
+        'expression': '$registration_model_insightscore > 900',
+        'outcomes': ['verify_outcome'],
+        'ruleVersion': '2' #Need specification of correct version according to your latest rule version
+    }
 
-        response = detector.create_new_rule_version(rule_object):
-        assert response['ResponseMetadata']['HTTPStatusCode'] == 200
+    response = detector.create_new_rule_version(rule_object)
+    assert response['ResponseMetadata']['HTTPStatusCode'] == 200
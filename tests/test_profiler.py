@@ -12,100 +12,153 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+from types import MappingProxyType
+
+import numpy as np
 import pandas as pd
-from pandas._testing import assert_frame_equal
 import pytest
 
-from frauddetector import profiler
+from .conftest import assert_frame_fast
 
 EVENT_COLUMN = "EVENT_LABEL"
 TIMESTAMP_COLUMN = "EVENT_TIMESTAMP"
-LABELS = [{'name': 'legit'}, {'name': 'fraud'}]
-VARS = [{
-            'name': 'Category',
-            'variableType': 'CATEGORY',
-            'dataType': 'STRING',
-            'defaultValue': 'unknown'
-        },
-        {
-            'name': 'Value',
-            'variableType': 'NUMERIC',
-            'dataType': 'FLOAT',
-            'defaultValue': 'unknown'
-        }
-    ]
-
-DATA = pd.DataFrame(
-    data=[
-        ["A", 42, "legit", "21-07-2021 11:01:23"],
-        ["B", 24, "fraud", "21-07-2021 12:05:13"],
-        ["B", 42, "legit", "21-07-2021 03:50:43"],
-        ["C", 42, "legit", "21-07-2021 01:36:06"]],
-    columns=["Category", "Value", EVENT_COLUMN, TIMESTAMP_COLUMN])
-
-
-SUMMARY = pd.DataFrame(
-    data=[
-        ['Category', "object", 4, 3, 0, 4, 0.0, 0.75],
-        ['Value', "int64", 4, 2, 0, 4, 0.0, 0.5],
-        ['EVENT_LABEL', "object", 4, 2, 0, 4, 0.0, 0.5],
-        ['EVENT_TIMESTAMP', "object", 4, 4, 0, 4, 0.0, 1.0]],
-    columns=["feature_name", "dtype", "count", "nunique", "null", "not_null", "null_pct", "nunique_pct"])
-
-def test___calculate_summary_stats():
-    prof = profiler.Profiler()
-    stats = prof._Profiler__calculate_summary_stats(data=DATA)
-    assert_frame_equal(stats, SUMMARY)
-    
-def test___check_column_in_dataframe():
-    prof = profiler.Profiler()
-    column_in_df = prof._Profiler__check_column_in_dataframe(data=DATA)
+# frozen so tests can share them by reference without one of them modifying the expectation for the rest
+LABELS = (MappingProxyType({'name': 'legit'}), MappingProxyType({'name': 'fraud'}))
+VARS = (
+    MappingProxyType({
+        'name': 'Category',
+        'variableType': 'CATEGORY',
+        'dataType': 'STRING',
+        'defaultValue': 'unknown'
+    }),
+    MappingProxyType({
+        'name': 'Value',
+        'variableType': 'NUMERIC',
+        'dataType': 'FLOAT',
+        'defaultValue': 'unknown'
+    })
+)
+
+DATA_ROWS = [
+    ("A", 42, "legit", "21-07-2021 11:01:23"),
+    ("B", 24, "fraud", "21-07-2021 12:05:13"),
+    ("B", 42, "legit", "21-07-2021 03:50:43"),
+    ("C", 42, "legit", "21-07-2021 01:36:06")]
+DATA_DTYPES = {"Category": "object", "Value": "int64", EVENT_COLUMN: "object", TIMESTAMP_COLUMN: "object"}
+
+SUMMARY_ROWS = [
+    ('Category', "object", 4, 3, 0, 4, 0.0, 0.75),
+    ('Value', "int64", 4, 2, 0, 4, 0.0, 0.5),
+    ('EVENT_LABEL', "object", 4, 2, 0, 4, 0.0, 0.5),
+    ('EVENT_TIMESTAMP', "datetime64[ns]", 4, 4, 0, 4, 0.0, 1.0)]
+SUMMARY_DTYPES = {"feature_name": "object", "dtype": "object", "count": "int64", "nunique": "int64",
+                  "null": "int64", "not_null": "int64", "null_pct": "float64", "nunique_pct": "float64"}
+
+
+def _data(parse_timestamps=True):
+    data = pd.DataFrame.from_records(DATA_ROWS, columns=list(DATA_DTYPES)).astype(DATA_DTYPES, copy=False)
+    if parse_timestamps:
+        # the timestamp format is known - parse it once so the profiler works on datetime64, not strings
+        data[TIMESTAMP_COLUMN] = pd.to_datetime(data[TIMESTAMP_COLUMN], format="%d-%m-%Y %H:%M:%S", cache=True)
+    return data
+
+
+@pytest.fixture
+def data():
+    """A fresh profiling input per test - tests may modify it without leaking into each other"""
+    return _data()
+
+
+@pytest.fixture(scope="module")
+def summary_stats(prof):
+    """get_summary_stats_table of data, computed once for the module - tests must not modify it"""
+    return prof.get_summary_stats_table(data=_data())
+
+
+@pytest.fixture
+def summary():
+    """The summary stats expected for data, fresh per test so tests can add their columns to it"""
+    return pd.DataFrame.from_records(SUMMARY_ROWS, columns=list(SUMMARY_DTYPES)).astype(SUMMARY_DTYPES, copy=False)
+
+
+@pytest.fixture
+def summary_full(summary):
+    """summary with the feature types and warnings get_summary_stats_table adds to it"""
+    return summary.assign(feature_type=['CATEGORY', 'NUMERIC', 'TARGET', 'EVENT_TIMESTAMP'],
+                          feature_warning=['NO WARNING', 'NO WARNING', 'NO WARNING', 'NO WARNING'])
+
+
+def test___calculate_summary_stats(prof, data, summary):
+    stats = prof._Profiler__calculate_summary_stats(data=data)
+    assert_frame_fast(stats, summary)
+
+
+def test___calculate_summary_stats_fast_path_parity(prof, data):
+    # a float column with gaps and a boolean one go through the numpy counting as well,
+    # nullable extension columns holding pd.NA through the pandas counting
+    data = data.assign(Amount=[1.5, np.nan, 1.5, 2.0], Flag=[True, False, True, True],
+                       Count=pd.array([1, None, 1, 2], dtype="Int64"),
+                       Checked=pd.array([True, None, False, True], dtype="boolean"))
+    slow = prof._Profiler__calculate_summary_stats(data=data)
+    fast = prof._Profiler__calculate_summary_stats(data=data, fast=True)
+    assert_frame_fast(fast, slow)
+
+
+def test___check_column_in_dataframe(prof, data):
+    column_in_df = prof._Profiler__check_column_in_dataframe(data=data)
     assert column_in_df == True
-    
-def test___map_feature_types():
-    prof = profiler.Profiler()
-    SUMMARY["feature_type"] = ['CATEGORY', 'NUMERIC', 'TARGET', 'EVENT_TIMESTAMP']
-    stats = prof._Profiler__calculate_summary_stats(data=DATA)
+
+
+def test___map_feature_types(prof, data, summary):
+    summary["feature_type"] = ['CATEGORY', 'NUMERIC', 'TARGET', 'EVENT_TIMESTAMP']
+    stats = prof._Profiler__calculate_summary_stats(data=data)
     maps = prof._Profiler__map_feature_types(df_stats=stats)
-    assert_frame_equal(maps, SUMMARY)
-    
-def test___screen_for_warnings():
-    prof = profiler.Profiler()
-    SUMMARY["feature_type"] = ['CATEGORY', 'NUMERIC', 'TARGET', 'EVENT_TIMESTAMP']
-    SUMMARY["feature_warning"] = ['NO WARNING', 'NO WARNING', 'NO WARNING', 'NO WARNING']
-    stats = prof._Profiler__calculate_summary_stats(data=DATA)
+    assert_frame_fast(maps, summary)
+
+
+def test___screen_for_warnings(prof, data, summary_full):
+    stats = prof._Profiler__calculate_summary_stats(data=data)
     maps = prof._Profiler__map_feature_types(df_stats=stats)
     warns = prof._Profiler__screen_for_warnings(df_types=maps)
-    assert_frame_equal(warns, SUMMARY)
-    
-def test_get_summary_stats_table():
-    prof = profiler.Profiler()
-    SUMMARY["feature_type"] = ['CATEGORY', 'NUMERIC', 'TARGET', 'EVENT_TIMESTAMP']
-    SUMMARY["feature_warning"] = ['NO WARNING', 'NO WARNING', 'NO WARNING', 'NO WARNING']
-    stats = prof.get_summary_stats_table(data=DATA)
-    assert_frame_equal(stats, SUMMARY)
-
-def test__create_labels():
-    prof = profiler.Profiler()
-    DATA[EVENT_COLUMN] = [x.lower() for x in DATA[EVENT_COLUMN].tolist()]
-    labels = prof._Profiler__create_labels(data=DATA, event_column=EVENT_COLUMN)
-    assert labels == LABELS
-
-def test___create_variables():
-    prof = profiler.Profiler()
-    stats = prof.get_summary_stats_table(data=DATA)
-    variables = prof._Profiler__create_variables(df_stats=stats, event_column=EVENT_COLUMN, timestamp_column=TIMESTAMP_COLUMN)
-    assert variables == VARS
-
-def test___extract_frauddetector_schema():
-    prof = profiler.Profiler()
-    SUMMARY["feature_type"] = ['CATEGORY', 'NUMERIC', 'TARGET', 'EVENT_TIMESTAMP']
-    SUMMARY["feature_warning"] = ['NO WARNING', 'NO WARNING', 'NO WARNING', 'NO WARNING']
-    warns = prof.get_summary_stats_table(data=DATA)
-    DATA[EVENT_COLUMN] = [x.lower() for x in DATA[EVENT_COLUMN].tolist()]
+    assert_frame_fast(warns, summary_full)
+
+
+def test_get_summary_stats_table(summary_stats, summary_full):
+    assert_frame_fast(summary_stats, summary_full)
+
+
+def test_get_summary_stats_table_string_timestamps(prof, summary_full):
+    # timestamps read from CSV arrive as strings - they are profiled as an object column of the same shape
+    summary_full.loc[summary_full["feature_name"] == TIMESTAMP_COLUMN, "dtype"] = "object"
+    stats = prof.get_summary_stats_table(data=_data(parse_timestamps=False))
+    assert_frame_fast(stats, summary_full)
+
+
+def test_get_summary_stats_table_reuses_last_result(prof, data, summary_full):
+    stats = prof.get_summary_stats_table(data=data)
+    stats["feature_warning"] = "CHANGED"
+    assert_frame_fast(prof.get_summary_stats_table(data=data), summary_full)
+    assert prof._stats_cache is not None
+    prof.reset()
+    assert prof._stats_cache is None
+
+
+def test__create_labels(prof, data):
+    data = data.assign(**{EVENT_COLUMN: data[EVENT_COLUMN].str.lower()})
+    labels = prof._Profiler__create_labels(data=data, event_column=EVENT_COLUMN)
+    assert tuple(labels) == LABELS
+
+
+def test___create_variables(prof, summary_stats):
+    variables = prof._Profiler__create_variables(df_stats=summary_stats, event_column=EVENT_COLUMN, timestamp_column=TIMESTAMP_COLUMN)
+    assert tuple(variables) == VARS
+
+
+def test___extract_frauddetector_schema(prof, data, summary_stats):
+    data = data.assign(**{EVENT_COLUMN: data[EVENT_COLUMN].str.lower()})
     data_schema, variables, labels = prof._Profiler__extract_frauddetector_schema(
-        data=DATA,
-        df_warn=warns,
+        data=data,
+        df_warn=summary_stats,
         event_column=EVENT_COLUMN,
         timestamp_column=TIMESTAMP_COLUMN,
         filter_warnings=False)
@@ -118,16 +171,14 @@ def test___extract_frauddetector_schema():
             }
         }
     }
-    assert variables == VARS
-    assert labels == LABELS
-
-def test_get_frauddetector_inputs():
-    prof = profiler.Profiler()
-    DATA[EVENT_COLUMN] = [x.lower() for x in DATA[EVENT_COLUMN].tolist()]
-    SUMMARY["feature_type"] = ['CATEGORY', 'NUMERIC', 'TARGET', 'EVENT_TIMESTAMP']
-    SUMMARY["feature_warning"] = ['NO WARNING', 'NO WARNING', 'NO WARNING', 'NO WARNING']
+    assert tuple(variables) == VARS
+    assert tuple(labels) == LABELS
+
+
+def test_get_frauddetector_inputs(prof, data):
+    data = data.assign(**{EVENT_COLUMN: data[EVENT_COLUMN].str.lower()})
     data_schema, variables, labels = prof.get_frauddetector_inputs(
-        data=DATA,
+        data=data,
         event_column=EVENT_COLUMN,
         timestamp_column=TIMESTAMP_COLUMN,
         filter_warnings=False)
@@ -140,5 +191,41 @@ def test_get_frauddetector_inputs():
             }
         }
     }
-    assert variables == VARS
-    assert labels == LABELS
\ No newline at end of file
+    assert tuple(variables) == VARS
+    assert tuple(labels) == LABELS
+
+
+def test_get_frauddetector_inputs_filter_warnings(prof, data):
+    data = data.assign(**{EVENT_COLUMN: data[EVENT_COLUMN].str.lower()})
+    # every feature screens clean, so filtering must not drop any of them
+    data_schema, variables, labels = prof.get_frauddetector_inputs(
+        data=data,
+        event_column=EVENT_COLUMN,
+        timestamp_column=TIMESTAMP_COLUMN,
+        filter_warnings=True)
+    assert data_schema['modelVariables'] == ['Category', 'Value']
+    assert tuple(variables) == VARS
+    assert tuple(labels) == LABELS
+
+
+def test_get_frauddetector_inputs_filter_warnings_drops_warned(prof, data):
+    # three of four values missing screens as "EXCLUDE, GT 50% MISSING"
+    data = data.assign(**{EVENT_COLUMN: data[EVENT_COLUMN].str.lower(), "Sparse": ["x", None, None, None]})
+    stats = prof.get_summary_stats_table(data=data)
+    assert stats.set_index("feature_name").at["Sparse", "feature_warning"] == "EXCLUDE, GT 50% MISSING"
+
+    data_schema, variables, _ = prof.get_frauddetector_inputs(
+        data=data,
+        event_column=EVENT_COLUMN,
+        timestamp_column=TIMESTAMP_COLUMN,
+        filter_warnings=False)
+    assert data_schema['modelVariables'] == ['Category', 'Value', 'Sparse']
+    assert [v['name'] for v in variables] == ['Category', 'Value', 'Sparse']
+
+    data_schema, variables, _ = prof.get_frauddetector_inputs(
+        data=data,
+        event_column=EVENT_COLUMN,
+        timestamp_column=TIMESTAMP_COLUMN,
+        filter_warnings=True)
+    assert data_schema['modelVariables'] == ['Category', 'Value']
+    assert tuple(variables) == VARS